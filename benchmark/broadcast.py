@@ -0,0 +1,83 @@
+"""
+向 10000 个连接广播同一条消息：逐个 await ASGI send vs Broadcast.publish。
+其中一个连接很慢（每次发送需要 50ms），对比 publish 本身的耗时以及所有正常连接收到消息所需的时间。
+
+    python benchmark/broadcast.py
+"""
+import time
+import typing
+
+import anyio
+from anyio.abc import TaskGroup
+
+from starlette.type import Message
+from starlette.websocket import WebSocket, WebSocketState
+from starlette.broadcast import Broadcast
+
+
+SUBSCRIBERS = 10_000
+SLOW_DELAY = 0.05
+
+
+def make_socket(
+        delivered: typing.List[float], slow: bool, task_group: typing.Optional[TaskGroup] = None,
+) -> typing.Tuple[WebSocket, typing.Callable]:
+    async def send(message: Message) -> None:
+        if slow:
+            await anyio.sleep(SLOW_DELAY)
+        else:
+            delivered.append(time.perf_counter())
+
+    async def receive() -> Message:
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    scope = {"type": "websocket", "path": "/", "headers": [], "query_string": b""}
+    websocket = WebSocket(scope, receive, send, max_queue_size=16)
+    websocket.client_state = websocket.application_state = WebSocketState.CONNECTED
+    if task_group is not None:
+        websocket.start_writer(task_group)
+    return websocket, send
+
+
+async def sequential(rounds: int) -> typing.Tuple[float, float]:
+    delivered: typing.List[float] = []
+    sends = [make_socket(delivered, slow=index == 0)[1] for index in range(SUBSCRIBERS)]
+    start = time.perf_counter()
+    for round_ in range(rounds):
+        message = {"type": "websocket.send", "text": f"message {round_}"}
+        for send in sends:
+            await send(message)
+    publish_time = time.perf_counter() - start
+    return publish_time, delivered[-1] - start
+
+
+async def broadcast(rounds: int) -> typing.Tuple[float, float]:
+    delivered: typing.List[float] = []
+    hub = Broadcast()
+    async with anyio.create_task_group() as task_group:
+        for index in range(SUBSCRIBERS):
+            hub.subscribe("room", make_socket(delivered, slow=index == 0, task_group=task_group)[0])
+        # 等所有 writer 启动并开始等待消息，与已经建立的连接相同
+        await anyio.wait_all_tasks_blocked()
+        start = time.perf_counter()
+        for round_ in range(rounds):
+            hub.publish("room", f"message {round_}")
+        publish_time = time.perf_counter() - start
+        while len(delivered) < (SUBSCRIBERS - 1) * rounds:
+            await anyio.sleep(0)
+        # 慢连接的 writer 还在发送，直接结束所有 writer
+        task_group.cancel_scope.cancel()
+    return publish_time, delivered[-1] - start
+
+
+async def main() -> None:
+    rounds = 5
+    print(f"{SUBSCRIBERS} subscribers, {rounds} messages, one subscriber takes {SLOW_DELAY * 1000:.0f}ms per send")
+    print(f"{'':>12} {'publish ms':>12} {'delivered ms':>14}")
+    for name, run in (("sequential", sequential), ("broadcast", broadcast)):
+        publish_time, delivered_time = await run(rounds)
+        print(f"{name:>12} {publish_time * 1000:>12.2f} {delivered_time * 1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    anyio.run(main)
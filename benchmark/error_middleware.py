@@ -0,0 +1,76 @@
+"""
+ServerErrorMiddleware + ExceptionMiddleware 两层嵌套 vs 合并后的 ErrorHandlingMiddleware。
+endpoint 直接返回一个空响应，对比每个请求的耗时以及处理一个请求时 tracemalloc 统计到的内存峰值。
+
+    python benchmark/error_middleware.py
+"""
+import time
+import typing
+import tracemalloc
+
+import anyio
+
+from starlette.type import ASGIApp, Message
+from starlette.route import Route
+from starlette.router import Router
+from starlette.response import Response
+from starlette.middleware.error import ServerErrorMiddleware, ErrorHandlingMiddleware
+from starlette.middleware.exception import ExceptionMiddleware
+
+
+EMPTY_RESPONSE = Response(b"")
+
+
+async def empty(request: typing.Any) -> Response:
+    return EMPTY_RESPONSE
+
+
+SCOPE = {"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""}
+
+
+async def receive() -> Message:
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message: Message) -> None:
+    pass
+
+
+async def time_per_request(app: ASGIApp, repeat: int) -> float:
+    """ 单位微秒 """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+
+async def peak_bytes_per_request(app: ASGIApp) -> int:
+    """ 一个请求处理过程中同时存在的分配（闭包、协程帧等）的峰值 """
+    await app(dict(SCOPE), receive, send)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await app(dict(SCOPE), receive, send)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - baseline
+
+
+async def main() -> None:
+    router = Router([Route("/", empty)])
+    stacks = {
+        "separate": ServerErrorMiddleware(ExceptionMiddleware(router)),
+        "fused": ErrorHandlingMiddleware(router),
+    }
+    repeat = 20_000
+
+    print(f"{'stack':>10} {'us/request':>12} {'peak bytes/request':>20}")
+    for name, app in stacks.items():
+        await time_per_request(app, 1_000)
+        per_request = min([await time_per_request(app, repeat) for _ in range(5)])
+        peak = await peak_bytes_per_request(app)
+        print(f"{name:>10} {per_request:>12.2f} {peak:>20}")
+
+
+if __name__ == "__main__":
+    anyio.run(main)
@@ -0,0 +1,79 @@
+"""
+冷启动导入耗时的预算检查。
+在子进程中用 python -X importtime 导入 starlette.application，取多次运行中最快的一次作为结果，
+超过预算或者导入了本应延迟加载的模块时以非 0 状态码退出，可以直接放进 CI。
+
+    python benchmark/import_time.py
+    python benchmark/import_time.py --budget-ms 150 --repeat 10
+"""
+import os
+import sys
+import typing
+import argparse
+import subprocess
+
+
+# 只在 debug、进程池、FileResponse 等功能第一次使用时才需要的模块
+LAZY_MODULES = (
+    "cgitb",
+    "email.utils",
+    "multiprocessing",
+    "concurrent.futures.process",
+    "starlette.middleware.debug",
+    "starlette.middleware.gzip",
+    "starlette.middleware.cache",
+    "starlette.middleware.metrics",
+    "starlette.staticfile",
+)
+
+
+def import_time(module: str) -> typing.Tuple[int, typing.Dict[str, int]]:
+    """ 返回 (module 的累计导入耗时, 每个被导入模块的累计耗时)，单位微秒 """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        check=True,
+    )
+
+    modules: typing.Dict[str, int] = {}
+    for line in result.stderr.decode("utf-8").splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules[module], modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="starlette.application")
+    parser.add_argument("--budget-ms", type=float, default=200.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # 第一次运行会生成 .pyc，不计入结果
+    import_time(args.module)
+    runs = [import_time(args.module) for _ in range(args.repeat)]
+    total, modules = min(runs, key=lambda run: run[0])
+
+    print(f"{'cumulative ms':>14}  module")
+    for name, cumulative in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:15]:
+        print(f"{cumulative / 1000:>14.2f}  {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in modules]
+    if eager:
+        print(f"\nFAIL: modules that should be loaded lazily were imported: {', '.join(eager)}")
+        failed = True
+
+    print(f"\nimport {args.module}: {total / 1000:.2f} ms (best of {args.repeat}), budget {args.budget_ms:.2f} ms")
+    if total / 1000 > args.budget_ms:
+        print("FAIL: import time is over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+JSONResponse 编码路径对比：在事件循环中编码 vs 超过阈值后放到线程池中编码。
+除了编码本身的耗时，还统计编码期间事件循环最长被阻塞了多久（同时运行一个每 1ms 醒来一次的协程）。
+
+    python benchmark/json_render.py
+"""
+import time
+import typing
+import datetime
+
+import anyio
+
+from starlette.response import JSONResponse
+from starlette.serializer import JSONSerializer, orjson_backend
+
+
+def make_payload(rows: int) -> typing.List[typing.Dict[str, typing.Any]]:
+    now = datetime.datetime(2022, 8, 1, 12, 0, 0)
+    return [
+        {"id": i, "name": f"user-{i}", "email": f"user-{i}@example.com", "score": i * 0.5, "created": now}
+        for i in range(rows)
+    ]
+
+
+async def send_nothing(message: typing.Any) -> None:
+    pass
+
+
+async def measure(serializer: JSONSerializer, payload: typing.Any, repeat: int) -> typing.Tuple[float, float]:
+    """ 返回 (每次响应的平均耗时, 事件循环最长的停顿时间)，单位毫秒 """
+    max_gap = 0.0
+    done = False
+
+    async def ticker() -> None:
+        nonlocal max_gap
+        last = time.perf_counter()
+        while not done:
+            await anyio.sleep(0.001)
+            now = time.perf_counter()
+            max_gap = max(max_gap, now - last)
+            last = now
+
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(ticker)
+        await anyio.sleep(0.01)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            response = JSONResponse(payload, serializer=serializer)
+            await response({"type": "http"}, None, send_nothing)
+        elapsed = time.perf_counter() - start
+        done = True
+
+    return elapsed / repeat * 1000, max_gap * 1000
+
+
+async def main() -> None:
+    serializers = {
+        "stdlib on loop": JSONSerializer(offload_threshold=None),
+        "stdlib adaptive": JSONSerializer(),
+    }
+    try:
+        serializers["orjson adaptive"] = JSONSerializer(backend=orjson_backend())
+    except RuntimeError:
+        pass
+
+    print(f"{'payload':>10} {'serializer':>16} {'ms/response':>12} {'max loop stall ms':>18}")
+    for rows in (10, 1_000, 20_000):
+        payload = make_payload(rows)
+        size = len(JSONSerializer().dumps(payload))
+        for name, serializer in serializers.items():
+            per_response, stall = await measure(serializer, payload, repeat=20)
+            print(f"{size:>10} {name:>16} {per_response:>12.3f} {stall:>18.3f}")
+
+
+if __name__ == "__main__":
+    anyio.run(main)
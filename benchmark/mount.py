@@ -0,0 +1,70 @@
+"""
+50 个 Mount（每个下面 20 个路由）以及 50 个 Host：按前缀/主机名建立索引 vs 逐个调用 matches。
+LinearMount / LinearHost 重写了 matches，不会进入索引，用来模拟没有索引时的匹配方式。
+
+    python benchmark/mount.py
+"""
+import time
+import typing
+
+from starlette.type import Scope
+from starlette.route import Route, Mount, Host
+from starlette.router import Router
+from starlette.response import Response
+
+
+EMPTY_RESPONSE = Response(b"")
+
+
+async def empty(request: typing.Any) -> Response:
+    return EMPTY_RESPONSE
+
+
+class LinearMount(Mount):
+    def matches(self, scope: Scope) -> typing.Any:
+        return super().matches(scope)
+
+
+class LinearHost(Host):
+    def matches(self, scope: Scope) -> typing.Any:
+        return super().matches(scope)
+
+
+def build(mount_class: typing.Type[Mount], host_class: typing.Type[Host]) -> Router:
+    routes = []
+    for index in range(50):
+        children = [Route(f"/item{child}/{{id:int}}", empty) for child in range(20)]
+        routes.append(mount_class(f"/service{index}", routes=children))
+    for index in range(50):
+        routes.append(host_class(f"tenant{index}.example.com", routes=[Route("/", empty)]))
+    return Router(routes)
+
+
+def scope(path: str, host: str = "example.com") -> Scope:
+    return {"type": "http", "method": "GET", "path": path, "headers": [(b"host", host.encode("latin-1"))]}
+
+
+def time_per_resolve(router: Router, request_scope: Scope, repeat: int = 20_000) -> float:
+    """ 单位微秒 """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        router.resolve(dict(request_scope))
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+
+def main() -> None:
+    cases = {
+        "last mount": scope("/service49/item19/1"),
+        "miss": scope("/unknown/path"),
+        "last host": scope("/", "tenant49.example.com"),
+    }
+    routers = {"indexed": build(Mount, Host), "linear": build(LinearMount, LinearHost)}
+
+    print(f"{'case':>12} " + " ".join(f"{name + ' us':>12}" for name in routers))
+    for case, request_scope in cases.items():
+        timings = [min(time_per_resolve(router, request_scope) for _ in range(3)) for router in routers.values()]
+        print(f"{case:>12} " + " ".join(f"{timing:>12.2f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
-from cgitb import handler
 import typing
 
 from starlette.type import ASGIApp, Scope, Receive, Send
-from starlette.route import BaseRoute
+from starlette.route import BaseRoute, Route, iter_routes
 from starlette.router import Router
 from starlette.request import Request
+from starlette.exception import HTTPException
 from starlette.response import Response
 from starlette.middleware import Middleware
 from starlette.datastructure import State
-from starlette.middleware.error import ServerErrorMiddleware
+from starlette.serializer import JSONSerializer, serializer_context
+from starlette.tracing import Tracer, Hook
+from starlette.background import BackgroundExecutor
+from starlette.concurrency import ThreadLimiter, ProcessExecutor, thread_limiter_context
+from starlette.middleware.error import ServerErrorMiddleware, ErrorHandlingMiddleware
 from starlette.middleware.exception import ExceptionMiddleware
 
 
@@ -32,7 +36,22 @@ class Starlette:
         on_shutdown: typing.Optional[typing.Sequence[typing.Callable]] = None,
         lifespan: typing.Optional[
             typing.Callable[["Starlette"], typing.AsyncContextManager]
-        ] = None
+        ] = None,
+        json_serializer: typing.Optional[JSONSerializer] = None,
+        # 同步 endpoint 和异常处理器共用的线程池容量
+        threadpool_size: int = 40,
+        # Route(executor="process") 使用的进程数，默认为 CPU 核数
+        process_workers: typing.Optional[int] = None,
+        # 后台任务队列的容量 | 执行后台任务的 worker 数量 | 关闭时等待后台任务完成的最长时间
+        background_queue_size: int = 1000,
+        background_workers: int = 8,
+        background_drain_timeout: float = 30.0,
+        # 启动时预热路由，见 Router.warmup
+        warmup: bool = False,
+        # 并发执行 on_startup 中的处理器，只在它们互不依赖时开启
+        concurrent_startup: bool = False,
+        # debug 模式下每秒最多完整渲染多少个 500 traceback，超过后只返回异常摘要，None 表示不限制
+        debug_render_rate: typing.Optional[float] = 10.0,
     ) -> None:
         # lifespan 上下文函数是 on_startup 和 on_shutdown 处理器的一种新写法
         # 使用其中一个即可，不要同时设置两者
@@ -40,14 +59,33 @@ class Starlette:
 
         # 初始化应用必要数据
         self._debug = debug
+        self.debug_render_rate = debug_render_rate
         self.state = State()
         self.router = Router(
             routes, on_startup=on_startup, on_shutdown=on_shutdown, lifespan=lifespan, redirect_slashes=False,
+            warmup=warmup, concurrent_startup=concurrent_startup,
         )
         self.exception_handlers = (
             {} if exception_handlers is None else dict(exception_handlers)
         )
         self.user_middleware = [] if middleware is None else list(middleware)
+        # JSONResponse 使用的序列化器，可以替换 backend 或通过 register 添加类型转换
+        self.json_serializer = JSONSerializer() if json_serializer is None else json_serializer
+        self.thread_limiter = ThreadLimiter(threadpool_size, name="app")
+        self.process_executor = ProcessExecutor(process_workers)
+        # 只有存在进程池路由（包括 Mount、Host 中的）时才在启动阶段创建子进程，关闭时总是尝试关闭（运行期间可能被懒加载启动）
+        # 资源的启动和关闭不放在 on_startup/on_shutdown 中，使用 lifespan 时也会执行
+        if any(isinstance(route, Route) and route.executor == "process" for route in iter_routes(self.router.routes)):
+            self.router.resource_startup.append(self.process_executor.startup)
+        self.router.resource_shutdown.append(self.process_executor.shutdown)
+        self.background_executor = BackgroundExecutor(
+            background_queue_size, background_workers, background_drain_timeout,
+        )
+        self.router.resource_startup.append(self.background_executor.startup)
+        # 先关闭后台任务队列：排队中的任务可能还会用到进程池
+        self.router.resource_shutdown.insert(0, self.background_executor.shutdown)
+        # 请求生命周期的 tracing hook，没有订阅者时不产生任何开销
+        self.tracer = Tracer()
 
         self.middleware_stack = self.build_middleware_stack()
 
@@ -83,8 +121,23 @@ class Starlette:
                 # TODO question what's means
                 exception_handlers[key] = value
         
+        # 没有自定义处理器的 404/405 由路由直接发送预先渲染好的响应
+        if HTTPException in exception_handlers:
+            self.router.prerendered_statuses = frozenset()
+        else:
+            self.router.prerendered_statuses = frozenset(
+                status_code for status_code in (404, 405) if status_code not in exception_handlers
+            )
+
+        # 两者之间没有用户 middleware 时合并成一层
+        if not self.user_middleware:
+            return ErrorHandlingMiddleware(
+                self.router, handlers=exception_handlers, error_handler=error_handler, debug=debug,
+                debug_render_rate=self.debug_render_rate,
+            )
+
         middleware = (
-            [Middleware(ServerErrorMiddleware, handler=error_handler, debug=debug)]
+            [Middleware(ServerErrorMiddleware, handler=error_handler, debug=debug, debug_render_rate=self.debug_render_rate)]
             + self.user_middleware
             + [
                 Middleware(ExceptionMiddleware, handlers=exception_handlers, debug=debug)
@@ -99,7 +152,26 @@ class Starlette:
 
         return app
 
+    def add_trace_hook(self, event: str, hook: Hook) -> None:
+        """ 订阅请求生命周期事件，事件和参数见 starlette.tracing """
+        self.tracer.subscribe(event, hook)
+
+    def trace_hook(self, event: str) -> typing.Callable[[Hook], Hook]:
+        def decorator(func: Hook) -> Hook:
+            self.add_trace_hook(event, func)
+            return func
+
+        return decorator
+
     async def __call__(self, scope: Scope, receive: Receive, send: Send):
         scope["app"] = self
-        await self.middleware_stack(scope, receive, send)
+        if self.tracer.active and scope["type"] != "lifespan":
+            send = self.tracer.start(scope).wrap_send(send)
+        serializer_token = serializer_context.set(self.json_serializer)
+        limiter_token = thread_limiter_context.set(self.thread_limiter)
+        try:
+            await self.middleware_stack(scope, receive, send)
+        finally:
+            thread_limiter_context.reset(limiter_token)
+            serializer_context.reset(serializer_token)
 
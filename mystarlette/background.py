@@ -0,0 +1,158 @@
+import time
+import typing
+import logging
+
+import anyio
+from anyio.abc import TaskGroup
+from anyio.streams.memory import MemoryObjectSendStream, MemoryObjectReceiveStream
+
+from starlette.utils import is_async_callable
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTask:
+    """ 响应发送完成之后执行的任务，同步函数在线程池中执行 """
+
+    def __init__(self, func: typing.Callable, *args: typing.Any, **kwargs: typing.Any) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.is_async = is_async_callable(func)
+
+    async def __call__(self) -> None:
+        if self.is_async:
+            await self.func(*self.args, **self.kwargs)
+        else:
+            await run_in_threadpool(self.func, *self.args, **self.kwargs)
+
+
+class BackgroundTasks(BackgroundTask):
+    """ 按添加顺序依次执行的一组任务 """
+
+    def __init__(self, tasks: typing.Optional[typing.Sequence[BackgroundTask]] = None) -> None:
+        self.tasks = list(tasks) if tasks else []
+
+    def add_task(self, func: typing.Callable, *args: typing.Any, **kwargs: typing.Any) -> None:
+        self.tasks.append(BackgroundTask(func, *args, **kwargs))
+
+    async def __call__(self) -> None:
+        for task in self.tasks:
+            await task()
+
+
+class BackgroundExecutor:
+    """
+    应用级别的后台任务执行器：响应只需要把任务放进有界队列，由固定数量的 worker 执行。
+    队列满时 submit 会等待，对产生任务的一方形成背压。
+    worker 运行在 startup 创建的 anyio task group 中，startup 和 shutdown 由应用的 lifespan 在同一个任务中调用；
+    没有启动时（例如不经过 lifespan 直接调用应用）submit 直接执行任务。
+    关闭时在 drain_timeout 秒内等待队列中的任务执行完毕，超时后取消剩余的任务。
+    """
+
+    def __init__(self, max_queue_size: int = 1000, workers: int = 8, drain_timeout: float = 30.0) -> None:
+        self.max_queue_size = max_queue_size
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self._send_stream: typing.Optional[MemoryObjectSendStream] = None
+        self._receive_stream: typing.Optional[MemoryObjectReceiveStream] = None
+        self._task_group: typing.Optional[TaskGroup] = None
+        # 所有 worker 都退出（队列已经关闭并且取空）时设置
+        self._drained: typing.Optional[anyio.Event] = None
+        self._running_workers = 0
+        # 已提交 | 已完成 | 失败 | 关闭时被丢弃
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        # 从提交到执行完成的耗时，单位秒
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._send_stream is not None
+
+    @property
+    def queue_depth(self) -> int:
+        if self._send_stream is None:
+            return 0
+        return self._send_stream.statistics().current_buffer_used
+
+    async def startup(self) -> None:
+        if self._send_stream is not None:
+            return
+        send_stream, receive_stream = anyio.create_memory_object_stream(self.max_queue_size)
+        task_group = anyio.create_task_group()
+        await task_group.__aenter__()
+        self._send_stream, self._receive_stream, self._task_group = send_stream, receive_stream, task_group
+        self._drained = anyio.Event()
+        self._running_workers = self.workers
+        for _ in range(self.workers):
+            task_group.start_soon(self._worker, receive_stream)
+
+    async def submit(self, task: typing.Callable[[], typing.Awaitable[None]]) -> None:
+        self.submitted += 1
+        if self._send_stream is None:
+            await self._run(time.perf_counter(), task)
+            return
+        await self._send_stream.send((time.perf_counter(), task))
+
+    async def _worker(self, receive_stream: MemoryObjectReceiveStream) -> None:
+        try:
+            async for submitted_at, task in receive_stream:
+                await self._run(submitted_at, task)
+        finally:
+            self._running_workers -= 1
+            if self._running_workers == 0:
+                self._drained.set()
+
+    async def _run(self, submitted_at: float, task: typing.Callable[[], typing.Awaitable[None]]) -> None:
+        try:
+            await task()
+        except Exception:
+            self.failed += 1
+            logger.exception("Background task %r failed", task)
+        else:
+            self.completed += 1
+        finally:
+            latency = time.perf_counter() - submitted_at
+            self.total_latency += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+
+    async def shutdown(self) -> None:
+        send_stream, receive_stream, task_group = self._send_stream, self._receive_stream, self._task_group
+        if send_stream is None:
+            return
+        self._send_stream = None
+
+        # 关闭发送端之后 worker 取完队列中剩余的任务就会退出
+        await send_stream.aclose()
+        with anyio.move_on_after(self.drain_timeout) as scope:
+            await self._drained.wait()
+        if scope.cancel_called:
+            remaining = receive_stream.statistics().current_buffer_used
+            self.dropped += remaining
+            logger.warning(
+                "Background tasks did not finish within %.1fs, %d queued tasks dropped",
+                self.drain_timeout, remaining,
+            )
+            task_group.cancel_scope.cancel()
+        await task_group.__aexit__(None, None, None)
+        await receive_stream.aclose()
+        self._receive_stream = self._task_group = None
+
+    def statistics(self) -> typing.Dict[str, typing.Any]:
+        finished = self.completed + self.failed
+        return {
+            "queue_depth": self.queue_depth,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "max_latency": self.max_latency,
+            "average_latency": self.total_latency / finished if finished else 0.0,
+        }
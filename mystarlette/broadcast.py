@@ -0,0 +1,86 @@
+import typing
+import contextlib
+
+from starlette.type import Message
+from starlette.websocket import WebSocket
+from starlette.serializer import get_serializer
+
+
+class Broadcast:
+    """
+    进程内的 WebSocket 广播。
+    publish 只把消息编码成 ASGI 的 websocket.send 消息一次，然后不等待地放进每个订阅者自己的有界发送队列，
+    由各连接的 writer 并发发送，慢的连接不会拖住 publish 和其它连接。
+    发送队列已满（或连接已经不可用）的订阅者会被移出所有频道，并在连接自己的 task group 中以 1008 关闭。
+    同一个消息对象会交给所有订阅者，下游不能修改它。
+    """
+
+    def __init__(self, evict_code: int = 1008, evict_reason: str = "Subscriber lagging") -> None:
+        self.channels: typing.Dict[str, typing.Set[WebSocket]] = {}
+        self.subscriptions: typing.Dict[WebSocket, typing.Set[str]] = {}
+        self.evict_code = evict_code
+        self.evict_reason = evict_reason
+        self.evicted = 0
+
+    def subscribe(self, channel: str, websocket: WebSocket) -> None:
+        self.channels.setdefault(channel, set()).add(websocket)
+        self.subscriptions.setdefault(websocket, set()).add(channel)
+
+    def unsubscribe(self, channel: str, websocket: WebSocket) -> None:
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(websocket)
+            if not subscribers:
+                del self.channels[channel]
+
+        channels = self.subscriptions.get(websocket)
+        if channels is not None:
+            channels.discard(channel)
+            if not channels:
+                del self.subscriptions[websocket]
+
+    def unsubscribe_all(self, websocket: WebSocket) -> None:
+        for channel in tuple(self.subscriptions.get(websocket, ())):
+            self.unsubscribe(channel, websocket)
+
+    @contextlib.contextmanager
+    def subscription(self, channel: str, websocket: WebSocket) -> typing.Iterator[None]:
+        """
+        with broadcast.subscription("room", websocket):
+            async for message in websocket:
+                broadcast.publish("room", message)
+        """
+        self.subscribe(channel, websocket)
+        try:
+            yield
+        finally:
+            self.unsubscribe(channel, websocket)
+
+    def publish(self, channel: str, data: typing.Union[str, bytes]) -> int:
+        """ 返回成功放入队列的订阅者数量 """
+        if isinstance(data, str):
+            message = {"type": "websocket.send", "text": data}
+        else:
+            message = {"type": "websocket.send", "bytes": data}
+        return self.publish_message(channel, message)
+
+    def publish_json(self, channel: str, data: typing.Any, mode: str = "text") -> int:
+        assert mode in ("text", "binary")
+        encoded = get_serializer().dumps(data)
+        return self.publish(channel, encoded.decode("utf-8") if mode == "text" else encoded)
+
+    def publish_message(self, channel: str, message: Message) -> int:
+        subscribers = self.channels.get(channel)
+        if not subscribers:
+            return 0
+
+        total = len(subscribers)
+        lagging = [websocket for websocket in subscribers if not websocket.offer(message)]
+        for websocket in lagging:
+            self.evict(websocket)
+        return total - len(lagging)
+
+    def evict(self, websocket: WebSocket) -> None:
+        self.unsubscribe_all(websocket)
+        self.evicted += 1
+        websocket.close_soon(self.evict_code, self.evict_reason)
@@ -1,6 +1,10 @@
+import os
 import sys
+import time
+import pickle
 import typing
 import functools
+import contextvars
 
 import anyio
 
@@ -9,13 +13,180 @@ if sys.version_info >= (3, 10):  # pragma: no cover
 else:  # pragma: no cover
     from typing_extensions import ParamSpec
 
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from concurrent.futures import ProcessPoolExecutor
+
 T = typing.TypeVar("T")
 P = ParamSpec("P")
 
 
+class ThreadLimiter:
+    """
+    限制同时在线程池中运行的同步调用数量，并记录排队等待的时间。
+    令牌在事件循环中获取，统计数据只会在事件循环线程中修改，不需要加锁。
+    """
+
+    def __init__(self, total_tokens: int = 40, name: str = "default") -> None:
+        self.name = name
+        self._limiter = anyio.CapacityLimiter(total_tokens)
+        # 传给 anyio 的 limiter 与 _limiter 容量相同，永远不会阻塞，只是为了不占用 anyio 的全局默认 limiter
+        self._thread_limiter = anyio.CapacityLimiter(total_tokens)
+        # 总调用次数 | 需要排队的调用次数 | 正在运行 | 正在排队 | 历史最大并发
+        self.calls = 0
+        self.queued_calls = 0
+        self.running = 0
+        self.waiting = 0
+        self.max_running = 0
+        # 等待令牌的总时间 | 最长的一次等待，单位秒
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return int(self._limiter.total_tokens)
+
+    @total_tokens.setter
+    def total_tokens(self, value: int) -> None:
+        self._limiter.total_tokens = value
+        self._thread_limiter.total_tokens = value
+
+    async def run(self, func: typing.Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        if kwargs:
+            func = functools.partial(func, **kwargs)
+
+        self.calls += 1
+        if self._limiter.available_tokens < 1:
+            self.queued_calls += 1
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self._limiter.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - start
+        self.total_wait += waited
+        if waited > self.max_wait:
+            self.max_wait = waited
+
+        self.running += 1
+        if self.running > self.max_running:
+            self.max_running = self.running
+        try:
+            return await anyio.to_thread.run_sync(func, *args, limiter=self._thread_limiter)
+        finally:
+            self.running -= 1
+            self._limiter.release()
+
+    def statistics(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "name": self.name,
+            "total_tokens": self.total_tokens,
+            "calls": self.calls,
+            "queued_calls": self.queued_calls,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_running": self.max_running,
+            "total_wait": self.total_wait,
+            "max_wait": self.max_wait,
+            "average_wait": self.total_wait / self.calls if self.calls else 0.0,
+        }
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(name={self.name!r}, total_tokens={self.total_tokens!r})"
+
+
+default_thread_limiter = ThreadLimiter()
+
+# 由 Starlette.__call__ 设置为当前应用的 limiter，run_in_threadpool 默认使用它
+thread_limiter_context: contextvars.ContextVar[ThreadLimiter] = contextvars.ContextVar(
+    "thread_limiter_context", default=default_thread_limiter,
+)
+
+
 async def run_in_threadpool(func: typing.Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
     # TODO question | what's this function's feature
-    if kwargs:
-        func = functools.partial(func, **kwargs)
     # TODO need-learn | anyio
-    return await anyio.to_thread.run_sync(func, *args)
\ No newline at end of file
+    return await thread_limiter_context.get().run(func, *args, **kwargs)
+
+
+class ProcessExecutor:
+    """
+    CPU 密集型 endpoint 使用的进程池，由应用的 lifespan 启动和关闭；
+    在 lifespan 之外第一次使用时也会自动启动。
+    默认使用 spawn 方式创建子进程，避免 fork 一个正在运行事件循环和线程池的进程。
+    """
+
+    def __init__(self, max_workers: typing.Optional[int] = None, mp_context: typing.Optional[str] = "spawn") -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.mp_context = mp_context
+        self._pool: typing.Optional["ProcessPoolExecutor"] = None
+        # 每个等待中的调用占用一个线程等待结果，同时等待的数量与子进程数量相同
+        self._limiter = anyio.CapacityLimiter(self.max_workers)
+
+    @property
+    def started(self) -> bool:
+        return self._pool is not None
+
+    def start(self) -> "ProcessPoolExecutor":
+        if self._pool is None:
+            # multiprocessing 只有在真正用到进程池时才导入
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            context = None if self.mp_context is None else multiprocessing.get_context(self.mp_context)
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=context)
+        return self._pool
+
+    async def startup(self) -> None:
+        # 提前创建好所有子进程，第一批请求不需要等待进程启动
+        self.start()
+        async with anyio.create_task_group() as task_group:
+            for _ in range(self.max_workers):
+                task_group.start_soon(self.run, os.getpid)
+
+    async def shutdown(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await anyio.to_thread.run_sync(pool.shutdown)
+
+    async def run(self, func: typing.Callable[..., T], *args: typing.Any) -> T:
+        pool = self.start()
+        try:
+            return await anyio.to_thread.run_sync(_submit_and_wait, pool, func, args, limiter=self._limiter)
+        except (pickle.PicklingError, TypeError, AttributeError) as exc:
+            # 不能 pickle 的对象按类型不同会抛出这三种异常之一（例如局部函数是 AttributeError，锁是 TypeError），
+            # 函数自己抛出的 TypeError 和 AttributeError 原样抛出
+            if not isinstance(exc, pickle.PicklingError) and "pickle" not in str(exc):
+                raise
+            name = getattr(func, "__qualname__", repr(func))
+            raise TypeError(f"Arguments or result of {name} cannot be sent to the process pool: {exc}") from exc
+
+
+def _submit_and_wait(pool: "ProcessPoolExecutor", func: typing.Callable[..., T], args: typing.Tuple[typing.Any, ...]) -> T:
+    return pool.submit(func, *args).result()
+
+
+default_process_executor = ProcessExecutor()
+
+
+class _StopIteration(Exception):
+    """ StopIteration 不能穿过 Future 传递，换成普通异常 """
+    pass
+
+
+def _next(iterator: typing.Iterator[T]) -> T:
+    try:
+        return next(iterator)
+    except StopIteration:
+        raise _StopIteration
+
+
+async def iterate_in_threadpool(iterator: typing.Iterable[T]) -> typing.AsyncIterator[T]:
+    """ 在线程池中逐个取出同步迭代器的元素，避免阻塞事件循环 """
+    iterator = iter(iterator)
+    limiter = thread_limiter_context.get()
+    while True:
+        try:
+            yield await limiter.run(_next, iterator)
+        except _StopIteration:
+            break
@@ -1,7 +1,9 @@
 import math
-import uuid
 import typing
 
+if typing.TYPE_CHECKING:  # pragma: no cover
+    import uuid
+
 
 T = typing.TypeVar("T")
 
@@ -62,7 +64,7 @@ class IntegerConvertor(Convertor):
 
 
 class FloatConvertor(Convertor):
-    regex = "[0-9]+(.[0-9]+)?"
+    regex = r"[0-9]+(\.[0-9]+)?"
 
     def convert(self, value: str) -> float:
         return float(value)
@@ -80,10 +82,11 @@ class FloatConvertor(Convertor):
 class UUIDConvetor(Convertor):
     regex = "[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
 
-    def convert(self, value: str) -> uuid.UUID:
+    def convert(self, value: str) -> "uuid.UUID":
+        import uuid
         return uuid.UUID(value)
 
-    def to_string(self, value: uuid.UUID) -> str:
+    def to_string(self, value: "uuid.UUID") -> str:
         return str(value)
 
 
@@ -1,5 +1,6 @@
 import typing
-from urllib.parse import SplitResult, urlsplit
+from collections import OrderedDict
+from urllib.parse import SplitResult, urlsplit, unquote_plus, urlencode
 
 from starlette.type import Scope
 
@@ -52,6 +53,26 @@ class URL:
             self._components = urlsplit(self._url)
         return self._components
 
+    @property
+    def scheme(self) -> str:
+        return self.components.scheme
+
+    @property
+    def netloc(self) -> str:
+        return self.components.netloc
+
+    @property
+    def path(self) -> str:
+        return self.components.path
+
+    @property
+    def query(self) -> str:
+        return self.components.query
+
+    @property
+    def is_secure(self) -> bool:
+        return self.scheme in ("https", "wss")
+
     @property
     def username(self) -> typing.Union[None, str]:
         return self.components.username
@@ -89,6 +110,15 @@ class URL:
         components = self.components._replace(**kwargs)
         return self.__class__(components.geturl())
 
+    def __eq__(self, other: typing.Any) -> bool:
+        return str(self) == str(other)
+
+    def __str__(self) -> str:
+        return self._url
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._url!r})"
+
 
 class URLPath(str):
 
@@ -100,20 +130,168 @@ class URLPath(str):
         self.protocol = protocol
         self.host = host
 
-    def make_absolute_url(self, base_url: typing.Union[str, URL]) -> str:
+    def make_absolute_url(self, base_url: typing.Union[str, URL]) -> URL:
         if isinstance(base_url, str):
-            pass
+            base_url = URL(base_url)
+
+        if self.protocol:
+            scheme = {
+                "http": {True: "https", False: "http"},
+                "websocket": {True: "wss", False: "ws"},
+            }[self.protocol][base_url.is_secure]
+        else:
+            scheme = base_url.scheme
+
+        netloc = self.host or base_url.netloc
+        path = base_url.path.rstrip("/") + str(self)
+        return URL(f"{scheme}://{netloc}{path}")
 
 
 class ImmutableMultiDict(typing.Mapping[_KeyType, _CovariantValueType]):
-    pass
+    """ 允许同一个 key 出现多次的只读字典，按 key 取值时返回最后一个值，getlist 返回全部 """
+    _dict: typing.Dict[_KeyType, _CovariantValueType]
+    _list: typing.List[typing.Tuple[_KeyType, _CovariantValueType]]
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        assert len(args) < 2, "Too many arguments."
+
+        value: typing.Any = args[0] if args else []
+        if kwargs:
+            value = ImmutableMultiDict(value).multi_items() + ImmutableMultiDict(kwargs).multi_items()
+
+        if not value:
+            _items: typing.List[typing.Tuple[typing.Any, typing.Any]] = []
+        elif hasattr(value, "multi_items"):
+            _items = list(value.multi_items())
+        elif hasattr(value, "keys"):
+            _items = list(value.items())
+        else:
+            _items = list(value)
+
+        self._dict = {k: v for k, v in _items}
+        self._list = _items
+
+    def getlist(self, key: typing.Any) -> typing.List[_CovariantValueType]:
+        return [item_value for item_key, item_value in self._list if item_key == key]
+
+    def keys(self) -> typing.KeysView[_KeyType]:
+        return self._dict.keys()
+
+    def values(self) -> typing.ValuesView[_CovariantValueType]:
+        return self._dict.values()
+
+    def items(self) -> typing.ItemsView[_KeyType, _CovariantValueType]:
+        return self._dict.items()
+
+    def multi_items(self) -> typing.List[typing.Tuple[_KeyType, _CovariantValueType]]:
+        return list(self._list)
+
+    def __getitem__(self, key: _KeyType) -> _CovariantValueType:
+        return self._dict[key]
+
+    def __contains__(self, key: typing.Any) -> bool:
+        return key in self._dict
+
+    def __iter__(self) -> typing.Iterator[_KeyType]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self._dict)
+
+    def __eq__(self, other: typing.Any) -> bool:
+        if not isinstance(other, self.__class__):
+            return False
+        return sorted(self._list) == sorted(other._list)
+
+    def __repr__(self) -> str:
+        class_name = self.__class__.__name__
+        items = self.multi_items()
+        return f"{class_name}({items!r})"
+
+
+def _unquote(value: str) -> str:
+    # 绝大多数参数不包含转义字符，此时不需要调用 unquote_plus
+    if "%" in value or "+" in value:
+        return unquote_plus(value)
+    return value
+
+
+class QueryParams(ImmutableMultiDict[str, str]):
+    """
+    查询参数。使用 query_string 创建时只保存原始字符串，第一次访问时才拆分；
+    拆分时只解码 key，value 在被取出时才解码。参数个数超过 max_params 时抛出 ValueError。
+    """
+    max_params = 1000
+
+    def __init__(self, *args: typing.Any, max_params: typing.Optional[int] = None, **kwargs: typing.Any) -> None:
+        if max_params is not None:
+            self.max_params = max_params
+
+        value = args[0] if args else ""
+        if isinstance(value, (str, bytes)) and not kwargs:
+            if isinstance(value, bytes):
+                value = value.decode("latin-1")
+            # 在拆分之前就拒绝，防止利用大量参数进行 hash flooding
+            if value.count("&") >= self.max_params:
+                raise ValueError(f"Query string has more than {self.max_params} parameters")
+            self._raw: typing.Optional[str] = value
+        else:
+            super().__init__(*args, **kwargs)
+            self._raw = None
+            self._pairs = self._list
+            self._raw_dict = self._dict
+
+    def __getattr__(self, name: str) -> typing.Any:
+        # 只在属性不存在（还没有解析）时才会被调用
+        if name == "_pairs":
+            pairs = []
+            for chunk in self._raw.split("&"):
+                if chunk:
+                    key, _, value = chunk.partition("=")
+                    pairs.append((_unquote(key), value))
+            self._pairs = pairs
+            return pairs
+        if name == "_raw_dict":
+            self._raw_dict = {k: v for k, v in self._pairs}
+            return self._raw_dict
+        if name == "_list":
+            self._list = [(k, self._decode(v)) for k, v in self._pairs]
+            return self._list
+        if name == "_dict":
+            self._dict = {k: self._decode(v) for k, v in self._raw_dict.items()}
+            return self._dict
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+
+    def _decode(self, value: str) -> str:
+        return value if self._raw is None else _unquote(value)
+
+    def getlist(self, key: typing.Any) -> typing.List[str]:
+        return [self._decode(item_value) for item_key, item_value in self._pairs if item_key == key]
+
+    def keys(self) -> typing.KeysView[str]:
+        return self._raw_dict.keys()
+
+    def __getitem__(self, key: str) -> str:
+        return self._decode(self._raw_dict[key])
 
+    def __contains__(self, key: typing.Any) -> bool:
+        return key in self._raw_dict
 
-class QueryParams:
-    pass
+    def __len__(self) -> int:
+        return len(self._raw_dict)
+
+    def __str__(self) -> str:
+        if self._raw is not None:
+            return self._raw
+        return urlencode(self._list)
 
 
 class Headers(typing.Mapping[str, str]):
+    """
+    大小写不敏感的只读 headers，直接使用原始的 ASGI 列表，不做拷贝。
+    第一次查找时建立 小写 bytes key -> 在列表中的位置 的索引，之后的查找都是一次 dict 访问。
+    通过 MutableHeaders 的方法修改时索引会同步更新；直接修改 raw 列表之后需要调用 invalidate()。
+    """
 
     def __init__(
             self,
@@ -134,43 +312,121 @@ class Headers(typing.Mapping[str, str]):
             assert scope is None, "Cannot set both \"raw\" and \"scope\""
             self._list = raw
         elif scope is not None:
-            self.list = scope["headers"]
+            self._list = scope["headers"]
+        self._index: typing.Optional[typing.Dict[bytes, typing.List[int]]] = None
+
+    @property
+    def index(self) -> typing.Dict[bytes, typing.List[int]]:
+        if self._index is None:
+            index: typing.Dict[bytes, typing.List[int]] = {}
+            for position, (key, _) in enumerate(self._list):
+                if key in index:
+                    index[key].append(position)
+                else:
+                    index[key] = [position]
+            self._index = index
+        return self._index
+
+    def invalidate(self) -> None:
+        """ raw 列表被直接修改之后调用，下一次查找时重建索引 """
+        self._index = None
+
+    @property
+    def raw(self) -> typing.List[typing.Tuple[bytes, bytes]]:
+        return self._list
+
+    def keys(self) -> typing.List[str]:  # type: ignore[override]
+        return [key.decode("latin-1") for key in self.index]
+
+    def values(self) -> typing.List[str]:  # type: ignore[override]
+        return [value.decode("latin-1") for _, value in self._list]
+
+    def items(self) -> typing.List[typing.Tuple[str, str]]:  # type: ignore[override]
+        return [(key.decode("latin-1"), value.decode("latin-1")) for key, value in self._list]
+
+    def getlist(self, key: str) -> typing.List[str]:
+        positions = self.index.get(key.lower().encode("latin-1"), ())
+        return [self._list[position][1].decode("latin-1") for position in positions]
+
+    def mutablecopy(self) -> "MutableHeaders":
+        return MutableHeaders(raw=self._list[:])
 
     def __getitem__(self, key: str) -> str:
-        get_header_key = key.lower().encode("latin-1")
-        for header_key, header_value in self._list:
-            if header_key == get_header_key:
-                return header_value.decode("latin-1")
-        raise KeyError(key)
+        positions = self.index.get(key.lower().encode("latin-1"))
+        if positions is None:
+            raise KeyError(key)
+        return self._list[positions[0]][1].decode("latin-1")
+
+    def __contains__(self, key: typing.Any) -> bool:
+        return isinstance(key, str) and key.lower().encode("latin-1") in self.index
 
     def __iter__(self) -> typing.Iterator[typing.Any]:
         return iter(self.keys())
 
     def __len__(self) -> int:
-        return len(self._list)
+        # 与 keys() 一致，重复的 key 只计算一次
+        return len(self.index)
+
+    def __eq__(self, other: typing.Any) -> bool:
+        if not isinstance(other, Headers):
+            return False
+        return sorted(self._list) == sorted(other._list)
+
+    def __repr__(self) -> str:
+        class_name = self.__class__.__name__
+        return f"{class_name}({dict(self.items())!r})"
 
 
 class MutableHeaders(Headers):
+    """ 修改时同时更新列表和索引；只有删除需要移动列表中的元素，此时索引会被重建 """
 
     def __setitem__(self, key: str, value: str) -> None:
         set_key = key.lower().encode("latin-1")
         set_value = value.encode("latin-1")
 
-        found_indexes = []
-        # 过滤重复项，并记录 index
-        for idx, (item_key, item_value) in enumerate(self._list):
-            if item_key == set_key:
-                found_indexes.append(idx)
-
-        # 删除重复项
-        for idx in reversed(found_indexes[1:]):
-            del self._list[idx]
-
-        if found_indexes:
-            idx = found_indexes[0]
-            self._list[idx] = (set_key, set_value)
-        else:
+        index = self.index
+        positions = index.get(set_key)
+        if positions is None:
             self._list.append((set_key, set_value))
+            index[set_key] = [len(self._list) - 1]
+            return
+
+        self._list[positions[0]] = (set_key, set_value)
+        if len(positions) > 1:
+            # 删除重复项
+            duplicates = set(positions[1:])
+            self._list[:] = [item for position, item in enumerate(self._list) if position not in duplicates]
+            self.invalidate()
+
+    def __delitem__(self, key: str) -> None:
+        del_key = key.lower().encode("latin-1")
+        if del_key not in self.index:
+            return
+        self._list[:] = [item for item in self._list if item[0] != del_key]
+        self.invalidate()
+
+    def setdefault(self, key: str, value: str) -> str:
+        if key in self:
+            return self[key]
+        self[key] = value
+        return value
+
+    def update(self, other: typing.Mapping[str, str]) -> None:
+        for key, value in other.items():
+            self[key] = value
+
+    def append(self, key: str, value: str) -> None:
+        """ 添加一个 header，允许出现重复的 key """
+        append_key = key.lower().encode("latin-1")
+        index = self.index
+        self._list.append((append_key, value.encode("latin-1")))
+        index.setdefault(append_key, []).append(len(self._list) - 1)
+
+    def add_vary_header(self, vary: str) -> None:
+        existing = self.get("vary")
+        if existing is not None:
+            vary = ", ".join([existing, vary])
+        self["vary"] = vary
 
 
 class State:
@@ -194,3 +450,46 @@ class State:
 
     def __delattr__(self, key: typing.Any) -> None:
         del self._state[key]
+
+
+class LRUCache(typing.Generic[_KeyType, _CovariantValueType]):
+    """ 按条目数量淘汰的 LRU 缓存，记录命中与未命中次数 """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        assert maxsize > 0, "LRUCache maxsize must be positive"
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[_KeyType, _CovariantValueType]" = OrderedDict()
+
+    def get(self, key: _KeyType, default: typing.Any = None) -> typing.Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: _KeyType, value: typing.Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: _KeyType, default: typing.Any = None) -> typing.Any:
+        return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: typing.Any) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        class_name = self.__class__.__name__
+        return f"{class_name}(maxsize={self.maxsize!r}, size={len(self)!r}, hits={self.hits!r}, misses={self.misses!r})"
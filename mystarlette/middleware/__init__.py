@@ -16,3 +16,22 @@ class Middleware:
         option_strings = [f"{key}={value}" for key, value in self.options.items()]
         args_repr = ", ".join([self.cls.__name__] + option_strings)
         return f"{class_name}({args_repr})"
+
+
+# 内置的 middleware 按需导入，只使用 Middleware 时不需要加载它们的依赖
+_LAZY_MIDDLEWARE = {
+    "CacheMiddleware": "starlette.middleware.cache",
+    "ErrorHandlingMiddleware": "starlette.middleware.error",
+    "ExceptionMiddleware": "starlette.middleware.exception",
+    "GZipMiddleware": "starlette.middleware.gzip",
+    "MetricsMiddleware": "starlette.middleware.metrics",
+    "ServerErrorMiddleware": "starlette.middleware.error",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    module_name = _LAZY_MIDDLEWARE.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    return getattr(importlib.import_module(module_name), name)
@@ -0,0 +1,337 @@
+import time
+import typing
+import hashlib
+from collections import OrderedDict
+
+from starlette.type import ASGIApp, Scope, Receive, Send, Message
+
+
+# 304 响应中需要保留的头部
+NOT_MODIFIED_HEADERS = (b"cache-control", b"content-location", b"date", b"etag", b"expires", b"vary")
+
+
+def parse_cache_control(value: str) -> typing.Dict[str, typing.Optional[str]]:
+    directives: typing.Dict[str, typing.Optional[str]] = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+# 响应带有其中之一时，带 Authorization 的请求的响应才可以存入共享缓存并被复用（RFC 9111 §3.5）
+AUTHORIZATION_DIRECTIVES = ("public", "s-maxage", "must-revalidate")
+
+
+def allows_authorization(cache_control: typing.Optional[typing.Dict[str, typing.Optional[str]]]) -> bool:
+    return cache_control is not None and any(name in cache_control for name in AUTHORIZATION_DIRECTIVES)
+
+
+def strong_etag(body: bytes) -> bytes:
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode("latin-1") + b'"'
+
+
+def opaque_tag(etag: bytes) -> bytes:
+    """ 去掉弱校验前缀 W/ """
+    return etag[2:] if etag.startswith(b"W/") else etag
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """ If-None-Match 使用弱比较（RFC 9110 §13.1.2）：忽略两边的 W/ 前缀，只比较引号中的部分 """
+    tags = [tag.strip() for tag in if_none_match.split(b",")]
+    if b"*" in tags:
+        return True
+    etag = opaque_tag(etag)
+    return any(opaque_tag(tag) == etag for tag in tags)
+
+
+class CacheEntry:
+    __slots__ = ("status", "headers", "body", "etag", "vary", "authorization", "expires", "stored_at", "size")
+
+    def __init__(
+            self,
+            status: int,
+            headers: typing.List[typing.Tuple[bytes, bytes]],
+            body: bytes,
+            etag: bytes,
+            vary: typing.Tuple[typing.Tuple[bytes, typing.Optional[bytes]], ...],
+            ttl: float,
+            authorization: bool,
+    ) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        # Vary 中列出的请求头以及存入缓存时它们的值
+        self.vary = vary
+        # 是否可以用于带 Authorization 的请求
+        self.authorization = authorization
+        self.stored_at = time.monotonic()
+        self.expires = self.stored_at + ttl
+        self.size = len(body) + sum(len(key) + len(value) for key, value in headers)
+
+
+class ResponseCache:
+    """ 按最近使用顺序淘汰的响应缓存，同时限制条目数量和总字节数，过期的条目在读取时删除 """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[typing.Any, CacheEntry]" = OrderedDict()
+
+    def get(self, key: typing.Any) -> typing.Optional[CacheEntry]:
+        entry = self._data.get(key)
+        if entry is not None and entry.expires <= time.monotonic():
+            self.pop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: typing.Any, entry: CacheEntry) -> None:
+        if entry.size > self.max_bytes:
+            return
+        self.pop(key)
+        self._data[key] = entry
+        self.nbytes += entry.size
+        while len(self._data) > self.max_entries or self.nbytes > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.nbytes -= evicted.size
+
+    def pop(self, key: typing.Any) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry.size
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheMiddleware:
+    """
+    GET/HEAD 响应的内存缓存。
+    只缓存响应的 Cache-Control 允许共享缓存的 200 响应（max-age/s-maxage，没有 no-store/private/no-cache），
+    没有 ETag 的响应会计算一个强 ETag。缓存命中时不会再调用后面的 app，If-None-Match 匹配时直接返回 304。
+    缓存键包含 scheme、Host 和 root_path，不同虚拟主机的同一路径互不影响；
+    带 Authorization 的请求只会读取和写入 Cache-Control 含有 public、s-maxage 或 must-revalidate 的响应。
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            max_entries: int = 1024,
+            max_bytes: int = 64 * 1024 * 1024,
+            # 单个响应体超过该大小时不缓存
+            max_entry_bytes: int = 1024 * 1024,
+            # 响应没有指定 max-age 时使用的缓存时间，None 表示不缓存这类响应
+            default_ttl: typing.Optional[float] = None,
+    ) -> None:
+        self.app = app
+        self.cache = ResponseCache(max_entries, max_bytes)
+        self.max_entry_bytes = max_entry_bytes
+        self.default_ttl = default_ttl
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        request_cache_control = parse_cache_control(request_headers.get(b"cache-control", b"").decode("latin-1"))
+        key = (
+            scope.get("scheme", "http"),
+            request_headers.get(b"host", b""),
+            scope.get("root_path", ""),
+            scope["path"],
+            scope.get("query_string", b""),
+        )
+        authorization = b"authorization" in request_headers
+
+        if "no-cache" not in request_cache_control and "no-store" not in request_cache_control:
+            entry = self.cache.get(key)
+            if (
+                    entry is not None
+                    and (entry.authorization or not authorization)
+                    and all(request_headers.get(name) == value for name, value in entry.vary)
+            ):
+                await self.send_cached(entry, scope, request_headers, send)
+                return
+
+        # 只有 GET 的响应体是完整的，HEAD 请求不写入缓存
+        if scope["method"] != "GET" or "no-store" in request_cache_control:
+            await self.app(scope, receive, send)
+            return
+
+        await self.capture(key, scope, receive, send, request_headers)
+
+    async def send_cached(
+            self,
+            entry: CacheEntry,
+            scope: Scope,
+            request_headers: typing.Dict[bytes, bytes],
+            send: Send,
+    ) -> None:
+        if_none_match = request_headers.get(b"if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            await self.send_not_modified(entry, send)
+            return
+
+        age = str(int(time.monotonic() - entry.stored_at)).encode("latin-1")
+        await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers + [(b"age", age)]})
+        body = b"" if scope["method"] == "HEAD" else entry.body
+        await send({"type": "http.response.body", "body": body})
+
+    async def send_not_modified(self, entry: CacheEntry, send: Send) -> None:
+        headers = [(name, value) for name, value in entry.headers if name in NOT_MODIFIED_HEADERS]
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+
+    def cache_ttl(
+            self,
+            status: int,
+            headers: typing.List[typing.Tuple[bytes, bytes]],
+            authorization: bool = False,
+    ) -> typing.Optional[float]:
+        """ 根据响应判断是否可以缓存，返回缓存时间；authorization 表示请求带有 Authorization """
+        if status != 200:
+            return None
+
+        cache_control = None
+        for key, value in headers:
+            if key == b"set-cookie":
+                return None
+            if key == b"vary" and value.strip() == b"*":
+                return None
+            if key == b"cache-control":
+                cache_control = parse_cache_control(value.decode("latin-1"))
+
+        if authorization and not allows_authorization(cache_control):
+            return None
+        if cache_control is None:
+            return self.default_ttl
+        if "no-store" in cache_control or "private" in cache_control or "no-cache" in cache_control:
+            return None
+
+        max_age = cache_control.get("s-maxage") or cache_control.get("max-age")
+        if max_age is None:
+            return self.default_ttl
+        try:
+            ttl = float(max_age)
+        except ValueError:
+            return None
+        return ttl if ttl > 0 else None
+
+    async def capture(
+            self,
+            key: typing.Any,
+            scope: Scope,
+            receive: Receive,
+            send: Send,
+            request_headers: typing.Dict[bytes, bytes],
+    ) -> None:
+        start_message: typing.Optional[Message] = None
+        ttl: typing.Optional[float] = None
+        chunks: typing.List[bytes] = []
+        size = 0
+        # 只有单个 body 消息的响应会先暂存 start 消息，以便在发送前补上 ETag 或改为 304
+        holding_start = False
+
+        async def sender(message: Message) -> None:
+            nonlocal start_message, ttl, size, holding_start
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                ttl = self.cache_ttl(
+                    message["status"], list(message.get("headers", [])), b"authorization" in request_headers,
+                )
+                if ttl is None:
+                    await send(message)
+                else:
+                    holding_start = True
+                return
+
+            if message["type"] != "http.response.body" or ttl is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if holding_start:
+                holding_start = False
+                if not more_body:
+                    await self.store_and_send(key, start_message, body, ttl, request_headers, send)
+                    ttl = None
+                    return
+                await send(start_message)
+
+            size += len(body)
+            if size > self.max_entry_bytes:
+                ttl = None
+                chunks.clear()
+            else:
+                chunks.append(body)
+                if not more_body:
+                    self.store(key, start_message, b"".join(chunks), ttl, request_headers)
+            await send(message)
+
+        await self.app(scope, receive, sender)
+
+    def store(
+            self,
+            key: typing.Any,
+            start_message: Message,
+            body: bytes,
+            ttl: float,
+            request_headers: typing.Dict[bytes, bytes],
+    ) -> CacheEntry:
+        headers = list(start_message.get("headers", []))
+        etag = None
+        cache_control = None
+        vary_names: typing.List[bytes] = []
+        for name, value in headers:
+            if name == b"etag":
+                etag = value
+            elif name == b"cache-control":
+                cache_control = parse_cache_control(value.decode("latin-1"))
+            elif name == b"vary":
+                vary_names.extend(item.strip().lower() for item in value.split(b","))
+
+        if etag is None:
+            etag = strong_etag(body)
+            headers.append((b"etag", etag))
+
+        vary = tuple((name, request_headers.get(name)) for name in vary_names if name)
+        entry = CacheEntry(start_message["status"], headers, body, etag, vary, ttl, allows_authorization(cache_control))
+        if len(body) <= self.max_entry_bytes:
+            self.cache.set(key, entry)
+        return entry
+
+    async def store_and_send(
+            self,
+            key: typing.Any,
+            start_message: Message,
+            body: bytes,
+            ttl: float,
+            request_headers: typing.Dict[bytes, bytes],
+            send: Send,
+    ) -> None:
+        entry = self.store(key, start_message, body, ttl, request_headers)
+
+        if_none_match = request_headers.get(b"if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            await self.send_not_modified(entry, send)
+            return
+
+        await send({**start_message, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,296 @@
+"""
+debug 模式下 500 页面的渲染。
+只有在第一次需要渲染 traceback 时才会被 ServerErrorMiddleware 导入，生产环境不需要加载这些模板。
+
+同一个位置抛出的异常（异常类型和调用栈相同）只完整渲染一次，之后复用缓存的 HTML/文本，只替换异常信息；
+源代码按文件缓存，不会在每次出错时重新读取。
+"""
+import html
+import time
+import typing
+import linecache
+import traceback
+import types
+
+from starlette.datastructure import LRUCache
+
+
+STYLES = """
+p {
+    color: #211c1c;
+}
+.traceback-container {
+    border: 1px solid #038BB8;
+}
+.traceback-title {
+    background-color: #038BB8;
+    color: lemonchiffon;
+    padding: 12px;
+    font-size: 20px;
+    margin-top: 0px;
+}
+.frame-line {
+    padding-left: 10px;
+    font-family: monospace;
+}
+.frame-filename {
+    font-family: monospace;
+}
+.center-line {
+    background-color: #038BB8;
+    color: #f9f6e1;
+    padding: 5px 0px 5px 5px;
+}
+.lineno {
+    margin-right: 5px;
+}
+.frame-title {
+    font-weight: unset;
+    padding: 10px 10px 10px 10px;
+    background-color: #E4F4FD;
+    margin-right: 10px;
+    color: #191f21;
+    font-size: 17px;
+    border: 1px solid #c7dce8;
+}
+.collapse-btn {
+    float: right;
+    padding: 0px 5px 1px 5px;
+    border: solid 1px #96aebb;
+    cursor: pointer;
+}
+.collapsed {
+  display: none;
+}
+.source-code {
+  font-family: courier;
+  font-size: small;
+  padding-bottom: 10px;
+}
+"""
+
+JS = """
+<script type="text/javascript">
+    function collapse(element){
+        const frameId = element.getAttribute("data-frame-id");
+        const frame = document.getElementById(frameId);
+
+        if (frame.classList.contains("collapsed")){
+            element.innerHTML = "&#8210;";
+            frame.classList.remove("collapsed");
+        } else {
+            element.innerHTML = "+";
+            frame.classList.add("collapsed");
+        }
+    }
+</script>
+"""
+
+TEMPLATE = """
+<html>
+    <head>
+        <style type="text/css">
+            {styles}
+        </style>
+        <title>Starlette Debugger</title>
+    </head>
+    <body>
+        <h1>500 Server Error</h1>
+        <h2>{error}</h2>
+        <div class="traceback-container">
+            <p class="traceback-title">Traceback</p>
+            <div>{exc_html}</div>
+        </div>
+        {js}
+    </body>
+</html>
+"""
+
+FRAME_TEMPLATE = """
+<div>
+    <p class="frame-title">File <span class="frame-filename">{frame_filename}</span>,
+    line <i>{frame_lineno}</i>,
+    in <b>{frame_name}</b>
+    <span class="collapse-btn" data-frame-id="{frame_filename}-{frame_lineno}" onclick="collapse(this)">{collapse_button}</span>
+    </p>
+    <div id="{frame_filename}-{frame_lineno}" class="source-code {collapsed}">{code_context}</div>
+</div>
+"""
+
+LINE = """
+<p><span class="frame-line">
+<span class="lineno">{lineno}.</span> {line}</span></p>
+"""
+
+CENTER_LINE = """
+<p class="center-line"><span class="frame-line center-line">
+<span class="lineno">{lineno}.</span> {line}</span></p>
+"""
+
+
+CAUSE_MESSAGE = "\nThe above exception was the direct cause of the following exception:\n\n"
+CONTEXT_MESSAGE = "\nDuring handling of the above exception, another exception occurred:\n\n"
+
+# (文件名, 行号, 函数名)
+FrameKey = typing.Tuple[str, int, str]
+
+
+def traceback_frames(tb: typing.Optional[types.TracebackType]) -> typing.Tuple[FrameKey, ...]:
+    frames = []
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        frames.append((code.co_filename, tb.tb_lineno, code.co_name))
+        tb = tb.tb_next
+    return tuple(frames)
+
+
+def exception_chain(exc: BaseException) -> typing.List[typing.Tuple[BaseException, typing.Optional[str]]]:
+    """ 与 traceback.format_exception 的顺序相同：最早的异常在前，每一项附带它与后一个（更新的）异常之间的说明 """
+    chain: typing.List[typing.Tuple[BaseException, typing.Optional[str]]] = []
+    seen = set()
+    link = None
+    current: typing.Optional[BaseException] = exc
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        chain.append((current, link))
+        if current.__cause__ is not None:
+            current, link = current.__cause__, CAUSE_MESSAGE
+        elif current.__context__ is not None and not current.__suppress_context__:
+            current, link = current.__context__, CONTEXT_MESSAGE
+        else:
+            current = None
+    chain.reverse()
+    return chain
+
+
+class SourceCache:
+    """ 按文件缓存源代码的所有行，出错时不需要再读取文件 """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.files: LRUCache = LRUCache(maxsize)
+
+    def lines(self, filename: str) -> typing.List[str]:
+        lines = self.files.get(filename)
+        if lines is None:
+            lines = linecache.getlines(filename)
+            self.files.set(filename, lines)
+        return lines
+
+    def line(self, filename: str, lineno: int) -> str:
+        lines = self.lines(filename)
+        return lines[lineno - 1] if 0 < lineno <= len(lines) else ""
+
+    def context(self, filename: str, lineno: int, context: int) -> typing.Tuple[typing.List[str], int]:
+        """ 以 lineno 为中心的 context 行源代码，以及 lineno 在其中的下标，与 inspect.getinnerframes 相同 """
+        lines = self.lines(filename)
+        if not lines:
+            return [], 0
+        start = max(0, min(lineno - 1 - context // 2, len(lines) - context))
+        return lines[start:start + context], lineno - 1 - start
+
+
+class TracebackRenderer:
+    """
+    按调用栈指纹缓存渲染结果，并限制每秒完整渲染的次数。
+    超过 max_per_second 后返回只包含异常信息的摘要，错误风暴时 worker 不会把时间花在渲染 traceback 上。
+    """
+
+    def __init__(self, cache_size: int = 128, max_per_second: typing.Optional[float] = 10.0) -> None:
+        self.sources = SourceCache()
+        self.html_cache: LRUCache = LRUCache(cache_size)
+        self.text_cache: LRUCache = LRUCache(cache_size)
+        self.max_per_second = max_per_second
+        self._window_start = 0.0
+        self._window_count = 0
+        # 被替换为摘要的错误数量
+        self.suppressed = 0
+
+    def allow(self) -> bool:
+        """ 当前这一秒内是否还可以完整渲染 """
+        if self.max_per_second is None:
+            return True
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start = now
+            self._window_count = 0
+        self._window_count += 1
+        if self._window_count > self.max_per_second:
+            self.suppressed += 1
+            return False
+        return True
+
+    def format_line(self, index: int, line: str, frame_lineno: int, frame_index: int) -> str:
+        values = {
+            "line": html.escape(line).replace(" ", "&nbsp"),
+            "lineno": (frame_lineno - frame_index) + index,
+        }
+
+        if index != frame_index:
+            return LINE.format(**values)
+        return CENTER_LINE.format(**values)
+
+    def generate_frame_html(self, frame: FrameKey, context: int, is_collapsed: bool) -> str:
+        filename, lineno, function = frame
+        lines, frame_index = self.sources.context(filename, lineno, context)
+        code_context = "".join(
+            self.format_line(index, line, lineno, frame_index)
+            for index, line in enumerate(lines)
+        )
+
+        values = {
+            "frame_filename": html.escape(filename),
+            "frame_lineno": lineno,
+            "frame_name": html.escape(function),
+            "code_context": code_context,
+            "collapsed": "collapsed" if is_collapsed else "",
+            "collapse_button": "+" if is_collapsed else "&#8210;",
+        }
+        return FRAME_TEMPLATE.format(**values)
+
+    def frames_html(self, exc: BaseException, context: int) -> str:
+        frames = traceback_frames(exc.__traceback__)
+        key = (type(exc), frames, context)
+        exc_html = self.html_cache.get(key)
+        if exc_html is None:
+            # 最内层的帧在最前面并且展开
+            exc_html = "".join(
+                self.generate_frame_html(frame, context, is_collapsed=index > 0)
+                for index, frame in enumerate(reversed(frames))
+            )
+            self.html_cache.set(key, exc_html)
+        return exc_html
+
+    def generate_html(self, exc: BaseException, limit: int = 7) -> str:
+        error = html.escape(summary(exc))
+        return TEMPLATE.format(styles=STYLES, js=JS, error=error, exc_html=self.frames_html(exc, limit))
+
+    def stack_text(self, tb: typing.Optional[types.TracebackType]) -> str:
+        frames = traceback_frames(tb)
+        text = self.text_cache.get(frames)
+        if text is None:
+            parts = []
+            for filename, lineno, function in frames:
+                parts.append(f'  File "{filename}", line {lineno}, in {function}\n')
+                line = self.sources.line(filename, lineno).strip()
+                if line:
+                    parts.append(f"    {line}\n")
+            text = "".join(parts)
+            self.text_cache.set(frames, text)
+        return text
+
+    def generate_plain_text(self, exc: BaseException) -> str:
+        parts = []
+        for item, link in exception_chain(exc):
+            if item.__traceback__ is not None:
+                parts.append("Traceback (most recent call last):\n")
+                parts.append(self.stack_text(item.__traceback__))
+            parts.extend(traceback.format_exception_only(type(item), item))
+            if link is not None:
+                parts.append(link)
+        return "".join(parts)
+
+
+def summary(exc: BaseException) -> str:
+    message = str(exc)
+    name = type(exc).__qualname__
+    return f"{name}: {message}" if message else name
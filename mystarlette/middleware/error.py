@@ -1,135 +1,58 @@
-import html
 import typing
-import inspect
-import traceback
 
 from starlette.type import ASGIApp, Scope, Receive, Send, Message
-from starlette.utils import is_async_callable, debug_print
+from starlette.utils import is_async_callable
 from starlette.request import Request
 from starlette.response import Response, HTMLResponse, PlainTextResponse
 from starlette.concurrency import run_in_threadpool
+from starlette.middleware.exception import ExceptionMiddleware
 
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from starlette.middleware.debug import TracebackRenderer
 
-STYLES = """
-p {
-    color: #211c1c;
-}
-.traceback-container {
-    border: 1px solid #038BB8;
-}
-.traceback-title {
-    background-color: #038BB8;
-    color: lemonchiffon;
-    padding: 12px;
-    font-size: 20px;
-    margin-top: 0px;
-}
-.frame-line {
-    padding-left: 10px;
-    font-family: monospace;
-}
-.frame-filename {
-    font-family: monospace;
-}
-.center-line {
-    background-color: #038BB8;
-    color: #f9f6e1;
-    padding: 5px 0px 5px 5px;
-}
-.lineno {
-    margin-right: 5px;
-}
-.frame-title {
-    font-weight: unset;
-    padding: 10px 10px 10px 10px;
-    background-color: #E4F4FD;
-    margin-right: 10px;
-    color: #191f21;
-    font-size: 17px;
-    border: 1px solid #c7dce8;
-}
-.collapse-btn {
-    float: right;
-    padding: 0px 5px 1px 5px;
-    border: solid 1px #96aebb;
-    cursor: pointer;
-}
-.collapsed {
-  display: none;
-}
-.source-code {
-  font-family: courier;
-  font-size: small;
-  padding-bottom: 10px;
-}
-"""
-
-JS = """
-<script type="text/javascript">
-    function collapse(element){
-        const frameId = element.getAttribute("data-frame-id");
-        const frame = document.getElementById(frameId);
-
-        if (frame.classList.contains("collapsed")){
-            element.innerHTML = "&#8210;";
-            frame.classList.remove("collapsed");
-        } else {
-            element.innerHTML = "+";
-            frame.classList.add("collapsed");
-        }
-    }
-</script>
-"""
-
-TEMPLATE = """
-<html>
-    <head>
-        <style type="text/css">
-            {styles}
-        </style>
-        <title>Starlette Debugger</title>
-    </head>
-    <body>
-        <h1>500 Server Error</h1>
-        <h2>{error}</h2>
-        <div class="traceback-container">
-            <p class="traceback-title">Traceback</p>
-            <div>{exc_html}</div>
-        </div>
-        {js}
-    </body>
-</html>
-"""
-
-FRAME_TEMPLATE = """
-<div>
-    <p class="frame-title">File <span class="frame-filename">{frame_filename}</span>,
-    line <i>{frame_lineno}</i>,
-    in <b>{frame_name}</b>
-    <span class="collapse-btn" data-frame-id="{frame_filename}-{frame_lineno}" onclick="collapse(this)">{collapse_button}</span>
-    </p>
-    <div id="{frame_filename}-{frame_lineno}" class="source-code {collapsed}">{code_context}</div>
-</div>
-"""
-
-LINE = """
-<p><span class="frame-line">
-<span class="lineno">{lineno}.</span> {line}</span></p>
-"""
-
-CENTER_LINE = """
-<p class="center-line"><span class="frame-line center-line">
-<span class="lineno">{lineno}.</span> {line}</span></p>
-"""
 
+# 模板和 traceback 渲染放在 starlette.middleware.debug 中，只在 debug 响应第一次渲染时导入
+DEBUG_TEMPLATE_NAMES = ("STYLES", "JS", "TEMPLATE", "FRAME_TEMPLATE", "LINE", "CENTER_LINE")
 
-class ServerErrorMiddleware:
-    """ 处理 500 响应。如果开启了 debug，返回 traceback response """
 
-    def __init__(self, app: ASGIApp, handler: typing.Optional[typing.Callable] = None, debug: bool = False) -> None:
+def __getattr__(name: str) -> typing.Any:
+    if name in DEBUG_TEMPLATE_NAMES:
+        from starlette.middleware import debug
+        return getattr(debug, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# 非 debug 模式下没有自定义处理器时返回的 500 响应，所有请求共用
+INTERNAL_SERVER_ERROR_RESPONSE = PlainTextResponse("Internal Server Error", status_code=500).freeze()
+
+
+class ServerErrorMiddleware:
+    """
+    处理 500 响应。如果开启了 debug，返回 traceback response。
+    相同调用栈的 traceback 只渲染一次；每秒完整渲染超过 debug_render_rate 次之后只返回异常摘要，None 表示不限制。
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            handler: typing.Optional[typing.Callable] = None,
+            debug: bool = False,
+            debug_render_rate: typing.Optional[float] = 10.0,
+            debug_cache_size: int = 128,
+    ) -> None:
         self.app = app
         self.handler = handler
         self.debug = debug
+        self.debug_render_rate = debug_render_rate
+        self.debug_cache_size = debug_cache_size
+        self._renderer: typing.Optional["TracebackRenderer"] = None
+
+    @property
+    def renderer(self) -> "TracebackRenderer":
+        if self._renderer is None:
+            from starlette.middleware.debug import TracebackRenderer
+            self._renderer = TracebackRenderer(self.debug_cache_size, self.debug_render_rate)
+        return self._renderer
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] != "http":
@@ -148,69 +71,34 @@ class ServerErrorMiddleware:
         try:
             await self.app(scope, receive, _send)
         except Exception as exc:
-            request = Request(scope)
-
-            if self.debug:
-                response = self.debug_response(request, exc)
-            elif self.handler is None:
-                response = self.error_response(request, exc)
-            else:
-                if is_async_callable(self.handler):
-                    response = await self.handler(request, exc)
-                else:
-                    response = await run_in_threadpool(self.handler, request, exc)
-
+            # 响应已经开始时也要调用处理器，应用可能依赖它记录日志或者告警，只是不再发送它的结果
+            response = await self.server_error_response(Request(scope), exc)
             if not response_started:
                 await response(scope, receive, send)
 
             raise exc
 
-    def format_line(self, index: int, line: str, frame_lineno: int, frame_index: int) -> str:
-        values = {
-            "line": html.escape(line).replace(" ", "&nbsp"),
-            "lineno": (frame_lineno - frame_index) + index,
-        }
-
-        if index != frame_index:
-            return LINE.format(**values)
-        return CENTER_LINE.format(**values)
-
-    def generate_frame_html(self, frame: inspect.FrameInfo, is_collapsed: bool) -> str:
-        code_context = "".join(
-            self.format_line(index, line, frame.lineno, frame.index)
-            for index, line in enumerate(frame.code_context or [])
-        )
-
-        values = {
-            "frame_filename": html.escape(frame.filename),
-            "frame_lineno": frame.lineno,
-            "frame_name": html.escape(frame.function),
-            "code_context": code_context,
-            "collapsed": "collapsed" if is_collapsed else "",
-            "collapsed_button": "+" if is_collapsed else "&#8210;",
-        }
-        return FRAME_TEMPLATE.format(**values)
+    async def server_error_response(self, request: Request, exc: Exception) -> Response:
+        if self.debug:
+            return self.debug_response(request, exc)
+        if self.handler is None:
+            return self.error_response(request, exc)
+        if is_async_callable(self.handler):
+            return await self.handler(request, exc)
+        return await run_in_threadpool(self.handler, request, exc)
 
     def generate_html(self, exc: Exception, limit: int = 7) -> str:
-        traceback_obj = traceback.TracebackException.from_exception(exc, capture_locals=True)
-
-        exc_html = ""
-        is_collapsed = False
-        exc_traceback = exc.__traceback__
-        if exc_traceback is not None:
-            frames = inspect.getinnerframes(exc_traceback, limit)
-            for frame in reversed(frames):
-                exc_html += self.generate_frame_html(frame, is_collapsed)
-                is_collapsed = True
-
-        error = ()
-
-        return TEMPLATE.format(styles=STYLES, js=JS, error=error, exc_html=exc_html)
+        return self.renderer.generate_html(exc, limit)
 
     def generate_plain_text(self, exc: Exception) -> str:
-        return "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+        return self.renderer.generate_plain_text(exc)
 
     def debug_response(self, request: Request, exc: Exception) -> Response:
+        if not self.renderer.allow():
+            from starlette.middleware.debug import summary
+            content = f"{summary(exc)}\n\nTraceback omitted: more than {self.debug_render_rate:g} server errors per second.\n"
+            return PlainTextResponse(content, status_code=500)
+
         accept = request.headers.get("accept", "")
 
         if "text/html" in accept:
@@ -221,5 +109,52 @@ class ServerErrorMiddleware:
         return PlainTextResponse(content, status_code=500)
 
     def error_response(self, request: Request, exc: Exception) -> Response:
-        pass
+        return INTERNAL_SERVER_ERROR_RESPONSE
+
+
+class ErrorHandlingMiddleware(ExceptionMiddleware):
+    """
+    ServerErrorMiddleware 和 ExceptionMiddleware 合并成的一层，两者之间没有用户 middleware 时由 Starlette 使用。
+    行为与两层嵌套时完全一致，但每个请求只包装一次 send、只多一层 await。
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            handlers: typing.Optional[typing.Mapping[typing.Any, typing.Callable[[Request, Exception], Response]]] = None,
+            error_handler: typing.Optional[typing.Callable] = None,
+            debug: bool = False,
+            debug_render_rate: typing.Optional[float] = 10.0,
+    ) -> None:
+        super().__init__(app, handlers=handlers, debug=debug)
+        self.server_error = ServerErrorMiddleware(
+            app, handler=error_handler, debug=debug, debug_render_rate=debug_render_rate,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def sender(message: Message) -> None:
+            nonlocal response_started
+
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sender)
+        except Exception as exc:
+            try:
+                # 相当于内层的 ExceptionMiddleware：没有对应的处理器时继续抛出
+                await self.handle_exception(exc, scope, receive, sender, response_started)
+            except Exception as server_exc:
+                # 相当于外层的 ServerErrorMiddleware
+                response = await self.server_error.server_error_response(Request(scope), server_exc)
+                if not response_started:
+                    await response(scope, receive, send)
+                raise server_exc
 
@@ -20,6 +20,8 @@ class ExceptionMiddleware:
         self.debug = debug
         self._status_handlers: typing.Dict[int, typing.Callable] = {}
         self._exception_handlers: typing.Dict[typing.Type[Exception], typing.Callable] = {HTTPException: self.http_exception}
+        # 异常类型 -> 处理器（或 None）的查找结果，避免每次都遍历 MRO
+        self._handler_cache: typing.Dict[type, typing.Optional[typing.Callable]] = {}
 
         if handlers is not None:
             for key, value in handlers.items():
@@ -35,12 +37,22 @@ class ExceptionMiddleware:
         else:
             assert issubclass(exc_class_or_status_code, Exception)
             self._exception_handlers[exc_class_or_status_code] = handler
+            self._handler_cache.clear()
 
     def _lookup_exception_handler(self, exc: Exception) -> typing.Optional[typing.Callable]:
-        for cls in type(exc).__mro__:
+        exc_type = type(exc)
+        try:
+            return self._handler_cache[exc_type]
+        except KeyError:
+            pass
+
+        handler = None
+        for cls in exc_type.__mro__:
             if cls in self._exception_handlers:
-                return self._exception_handlers[cls]
-        return None
+                handler = self._exception_handlers[cls]
+                break
+        self._handler_cache[exc_type] = handler
+        return handler
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send):
         # TODO question | what's mean
@@ -60,27 +72,38 @@ class ExceptionMiddleware:
         try:
             await self.app(scope, receive, sender)
         except Exception as exc:
-            handler = None
+            await self.handle_exception(exc, scope, receive, sender, response_started)
+
+    async def handle_exception(
+            self,
+            exc: Exception,
+            scope: Scope,
+            receive: Receive,
+            send: Send,
+            response_started: bool,
+    ) -> None:
+        """ 用注册的处理器生成响应，没有对应的处理器时重新抛出异常 """
+        handler = None
 
-            if isinstance(exc, HTTPException):
-                handler = self._status_handlers.get(exc.status_code)
+        if isinstance(exc, HTTPException):
+            handler = self._status_handlers.get(exc.status_code)
 
-            if handler is None:
-                handler = self._lookup_exception_handler(exc)
+        if handler is None:
+            handler = self._lookup_exception_handler(exc)
 
-            if handler is None:
-                raise exc
+        if handler is None:
+            raise exc
 
-            if response_started:
-                msg = "Caught handled exception, but response already started."
-                raise RuntimeError(msg) from exc
+        if response_started:
+            msg = "Caught handled exception, but response already started."
+            raise RuntimeError(msg) from exc
 
-            request = Request(scope, receive=receive)
-            if is_async_callable(handler):
-                response = await handler(request, exc)
-            else:
-                response = await run_in_threadpool(handler, request, exc)
-            await response(scope, receive, sender)
+        request = Request(scope, receive=receive)
+        if is_async_callable(handler):
+            response = await handler(request, exc)
+        else:
+            response = await run_in_threadpool(handler, request, exc)
+        await response(scope, receive, send)
 
     def http_exception(self, request: Request, exc: HTTPException) -> Response:
         if exc.status_code in {204, 304}:
@@ -0,0 +1,198 @@
+import zlib
+import typing
+
+from starlette.type import ASGIApp, Scope, Receive, Send, Message
+from starlette.concurrency import run_in_threadpool
+
+
+# 本身已经压缩过的内容，再压缩一次只会浪费 CPU
+DEFAULT_EXCLUDED_MEDIA_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+)
+# 图片中只有 svg 是文本，压缩效果很好
+COMPRESSIBLE_MEDIA_TYPES = ("image/svg+xml",)
+
+
+def accepts_gzip(accept_encoding: bytes) -> bool:
+    """ 按 q 值判断 Accept-Encoding 是否接受 gzip，q=0 表示不接受；没有列出 gzip 时看 * """
+    gzip_q: typing.Optional[float] = None
+    any_q: typing.Optional[float] = None
+    for item in accept_encoding.decode("latin-1").split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ("gzip", "x-gzip"):
+            gzip_q = q
+        elif coding == "*":
+            any_q = q
+    if gzip_q is not None:
+        return gzip_q > 0
+    return any_q is not None and any_q > 0
+
+
+class GZipMiddleware:
+    """
+    对响应进行 gzip 压缩。
+    单个 body 的响应小于 minimum_size 时不压缩，大于 offload_size 时放到线程池中压缩；
+    分块发送的响应逐块压缩并 flush，保持流式发送。
+    206 以及带有 Content-Range 的响应不压缩，范围是按未压缩的字节计算的。
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 500,
+            compresslevel: int = 6,
+            offload_size: int = 256 * 1024,
+            excluded_media_types: typing.Sequence[str] = DEFAULT_EXCLUDED_MEDIA_TYPES,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.offload_size = offload_size
+        self.excluded_media_types = tuple(excluded_media_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            for key, value in scope["headers"]:
+                if key == b"accept-encoding":
+                    if accepts_gzip(value):
+                        responder = GZipResponder(self.app, self)
+                        await responder(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+    def is_compressible(self, status: int, headers: typing.List[typing.Tuple[bytes, bytes]]) -> bool:
+        if status == 206:
+            return False
+        for key, value in headers:
+            if key == b"content-encoding" or key == b"content-range":
+                return False
+            if key == b"content-type":
+                media_type = value.decode("latin-1").split(";")[0].strip().lower()
+                if media_type.startswith(COMPRESSIBLE_MEDIA_TYPES):
+                    return True
+                if media_type.startswith(self.excluded_media_types):
+                    return False
+        return True
+
+
+def set_compressed_headers(
+        headers: typing.List[typing.Tuple[bytes, bytes]],
+        content_length: typing.Optional[int],
+) -> typing.List[typing.Tuple[bytes, bytes]]:
+    """ 替换 content-length（流式响应时去掉），添加 content-encoding，并在 vary 中加入 Accept-Encoding """
+    result = []
+    vary_found = False
+    for key, value in headers:
+        if key == b"content-length":
+            continue
+        if key == b"vary":
+            vary_found = True
+            if b"accept-encoding" not in value.lower():
+                value = value + b", Accept-Encoding"
+        result.append((key, value))
+
+    if not vary_found:
+        result.append((b"vary", b"Accept-Encoding"))
+    result.append((b"content-encoding", b"gzip"))
+    if content_length is not None:
+        result.append((b"content-length", str(content_length).encode("latin-1")))
+    return result
+
+
+class GZipResponder:
+
+    def __init__(self, app: ASGIApp, middleware: GZipMiddleware) -> None:
+        self.app = app
+        self.middleware = middleware
+        self.send: Send = unattached_send
+        self.start_message: typing.Optional[Message] = None
+        # None：还没有收到第一个 body；False：不压缩，直接透传；True：正在压缩
+        self.compressing: typing.Optional[bool] = None
+        # wbits=31 表示输出 gzip 格式
+        self.compressor = zlib.compressobj(middleware.compresslevel, zlib.DEFLATED, 31)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_gzip)
+
+    async def compress(self, body: bytes, mode: int) -> bytes:
+        # 较大的数据块在线程池中压缩，zlib 在压缩时会释放 GIL
+        if len(body) >= self.middleware.offload_size:
+            return await run_in_threadpool(self._compress, body, mode)
+        return self._compress(body, mode)
+
+    def _compress(self, body: bytes, mode: int) -> bytes:
+        return self.compressor.compress(body) + self.compressor.flush(mode)
+
+    async def send_with_gzip(self, message: Message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # 是否压缩要等到看见第一个 body 之后才能决定，先暂存
+            self.start_message = message
+            return
+
+        if message_type != "http.response.body":
+            # 例如 http.response.zerocopysend：内容不经过这里，不压缩，先把暂存的 start 原样发出去
+            if self.compressing is None and self.start_message is not None:
+                self.compressing = False
+                await self.send(self.start_message)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressing is None:
+            start_message = self.start_message
+            headers = list(start_message.get("headers", []))
+
+            if (
+                    not self.middleware.is_compressible(start_message["status"], headers)
+                    or (not more_body and len(body) < self.middleware.minimum_size)
+            ):
+                self.compressing = False
+                await self.send(start_message)
+                await self.send(message)
+                return
+
+            self.compressing = True
+            if not more_body:
+                compressed = await self.compress(body, zlib.Z_FINISH)
+                await self.send({**start_message, "headers": set_compressed_headers(headers, len(compressed))})
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            await self.send({**start_message, "headers": set_compressed_headers(headers, None)})
+
+        if not self.compressing:
+            await self.send(message)
+            return
+
+        # 每块都 flush，保证已经生成的内容能够立即发送给客户端
+        mode = zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH
+        compressed = await self.compress(body, mode)
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+
+async def unattached_send(message: Message) -> typing.NoReturn:
+    raise RuntimeError("send awaitable not set")  # pragma: no cover
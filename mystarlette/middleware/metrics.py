@@ -0,0 +1,234 @@
+import time
+import bisect
+import typing
+
+from starlette.type import ASGIApp, Scope, Receive, Send, Message
+from starlette.route import Mount, compile_path
+from starlette.router import Router, routes_version
+
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+# 没有匹配到任何路由的请求统一记在这个标签下，避免原始路径让标签数量无限增长
+UNMATCHED_ROUTE = "<unmatched>"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """ 固定 bucket 的直方图，counts 中每个 bucket 只记录落在其中的数量，输出时再累加 """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: typing.Sequence[float]) -> None:
+        self.buckets = buckets
+        # 最后一个位置是 +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum: float = 0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteMetrics:
+    __slots__ = ("statuses", "latency", "size")
+
+    def __init__(self, latency_buckets: typing.Sequence[float], size_buckets: typing.Sequence[float]) -> None:
+        self.statuses: typing.Dict[int, int] = {}
+        self.latency = Histogram(latency_buckets)
+        self.size = Histogram(size_buckets)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_bound(bound: float) -> str:
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+class MetricsRegistry:
+    """
+    按 (method, 路由模板) 汇总的请求指标。
+    所有记录都发生在事件循环线程中（同步 endpoint 在线程池中执行，但指标由 middleware 在事件循环中记录），
+    不需要加锁，每个请求只是几次字典查找和整数加法。
+    """
+
+    def __init__(
+            self,
+            latency_buckets: typing.Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+            size_buckets: typing.Sequence[float] = DEFAULT_SIZE_BUCKETS,
+    ) -> None:
+        self.latency_buckets = tuple(sorted(latency_buckets))
+        self.size_buckets = tuple(sorted(size_buckets))
+        self.routes: typing.Dict[typing.Tuple[str, str], RouteMetrics] = {}
+        self.in_flight: typing.Dict[str, int] = {}
+
+    def route_metrics(self, method: str, route: str) -> RouteMetrics:
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics(self.latency_buckets, self.size_buckets)
+        return metrics
+
+    def record(self, method: str, route: str, status_code: int, duration: float, size: int) -> None:
+        metrics = self.route_metrics(method, route)
+        metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+        metrics.latency.observe(duration)
+        metrics.size.observe(size)
+
+    def render(self) -> str:
+        """ Prometheus 文本格式 """
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for method, value in sorted(self.in_flight.items()):
+            lines.append(f'http_requests_in_flight{{method="{escape_label(method)}"}} {value}')
+
+        routes = sorted(self.routes.items())
+        labels = {key: f'method="{escape_label(key[0])}",route="{escape_label(key[1])}"' for key, _ in routes}
+
+        lines.append("# HELP http_requests_total Requests by route template and status code.")
+        lines.append("# TYPE http_requests_total counter")
+        for key, metrics in routes:
+            for status_code, value in sorted(metrics.statuses.items()):
+                lines.append(f'http_requests_total{{{labels[key]},status="{status_code}"}} {value}')
+
+        for name, help_text, attribute in (
+                ("http_request_duration_seconds", "Request latency by route template.", "latency"),
+                ("http_response_size_bytes", "Response body size by route template.", "size"),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, metrics in routes:
+                histogram: Histogram = getattr(metrics, attribute)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels[key]},le="{format_bound(bound)}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels[key]},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels[key]}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels[key]}}} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def find_routes(
+        routes: typing.Iterable[typing.Any],
+        endpoint: typing.Any,
+        prefix: str = "",
+) -> typing.Iterator[typing.Tuple[str, typing.Any]]:
+    """
+    产出 endpoint 所在的 (完整的路由模板, route)，会进入 Mount 和 Host 的子路由，模板加上 Mount 的前缀。
+    挂载普通 ASGI app（例如 StaticFiles）的 Mount 以 Mount 的路径模板产出。
+    """
+    for route in routes:
+        if getattr(route, "endpoint", None) is endpoint:
+            yield prefix + route.path, route
+        elif isinstance(route, Mount) and route.app is endpoint and not isinstance(endpoint, Router):
+            yield prefix + route.path + "/{path:path}", route
+        children = getattr(route, "routes", None)
+        if children:
+            # Host 没有 path，不影响前缀
+            yield from find_routes(children, endpoint, prefix + getattr(route, "path", ""))
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的状态码、耗时和响应大小，按匹配到的路由模板（Route.path）汇总，并在 path 上提供文本格式的指标。
+    路由模板通过 Route.matches 放入 scope 的 endpoint 查找，同一个 endpoint 只查找一次，路由变化后重新查找。
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            registry: typing.Optional[MetricsRegistry] = None,
+            path: typing.Optional[str] = "/metrics",
+    ) -> None:
+        self.app = app
+        self.registry = MetricsRegistry() if registry is None else registry
+        self.path = path
+        # endpoint -> 唯一的路由模板 | endpoint 挂在多个路由上时的 (模板, 正则)，任意路由变化时清空
+        self.templates: typing.Dict[typing.Any, str] = {}
+        self.candidates: typing.Dict[typing.Any, typing.List[typing.Tuple[str, typing.Pattern]]] = {}
+        self.routes_version = routes_version()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"] == self.path and scope["method"] in ("GET", "HEAD"):
+            await self.send_metrics(scope, send)
+            return
+
+        registry = self.registry
+        method = scope["method"]
+        in_flight = registry.in_flight
+        in_flight[method] = in_flight.get(method, 0) + 1
+        status_code = 500
+        size = 0
+
+        async def metrics_send(message: Message) -> None:
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, metrics_send)
+        finally:
+            duration = time.perf_counter() - start
+            in_flight[method] -= 1
+            registry.record(method, self.route_template(scope), status_code, duration, size)
+
+    def route_template(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        version = routes_version()
+        if version != self.routes_version:
+            # 路由发生了变化，重新查找
+            self.routes_version = version
+            self.templates.clear()
+            self.candidates.clear()
+        template = self.templates.get(endpoint)
+        if template is not None:
+            return template
+
+        candidates = self.candidates.get(endpoint)
+        if candidates is None:
+            candidates = [
+                (template, compile_path(template)[0])
+                for template, _ in find_routes(getattr(scope.get("router"), "routes", ()), endpoint)
+            ]
+            if len(candidates) == 1:
+                template = self.templates[endpoint] = candidates[0][0]
+                return template
+            self.candidates[endpoint] = candidates
+        # 同一个 endpoint 挂在多个路由上时，用完整的路径与模板再区分一次
+        # 经过 Mount 之后 scope["path"] 只剩去掉前缀的部分，前缀在 root_path 中
+        root_path = scope.get("root_path", "")
+        path = root_path[len(scope.get("app_root_path", root_path)):] + scope["path"]
+        for template, regex in candidates:
+            if regex.match(path):
+                return template
+        return UNMATCHED_ROUTE
+
+    async def send_metrics(self, scope: Scope, send: Send) -> None:
+        body = self.registry.render().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", CONTENT_TYPE.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
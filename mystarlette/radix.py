@@ -0,0 +1,153 @@
+import re
+import typing
+
+from starlette.route import Route, WebSocketRoute, Mount, Host, PARAM_REGEX
+from starlette.convertor import PathConvertor
+
+
+class RadixNode:
+    """ 前缀树节点，每一层对应 path 中以 "/" 分隔的一段，节点中的 Route 也可以是 WebSocketRoute 或 Mount """
+    __slots__ = ("static", "params", "tails", "routes")
+
+    def __init__(self) -> None:
+        # 静态段：直接通过 dict 跳转
+        self.static: typing.Dict[str, "RadixNode"] = {}
+        # 参数段：只有这里才会用到 Convertor 的正则，相同正则共用一个子节点
+        self.params: typing.Dict[str, typing.Tuple[typing.Pattern, "RadixNode"]] = {}
+        # 以 path 类型参数结尾的路由，会吞掉剩余的所有段
+        self.tails: typing.List[typing.Tuple[typing.Pattern, int, Route]] = []
+        # 在该节点结束的路由，保存其在 Router.routes 中的下标用于还原优先级
+        self.routes: typing.List[typing.Tuple[int, Route]] = []
+
+
+# matches 没有被重写时，匹配规则与树一致的路由类型
+INDEXED_MATCHES = (Route.matches, WebSocketRoute.matches, Mount.matches)
+
+
+def compile_segments(
+        path: str,
+        param_convertors: typing.Dict[str, typing.Any],
+) -> typing.Optional[typing.List[typing.Union[str, typing.Tuple[bool, typing.Pattern]]]]:
+    """
+    将 path 按段拆分：静态段保留字符串，含参数的段编译为只匹配该段的正则。
+    path 类型参数可以跨越 "/"，只有出现在最后一段时才能放进树里，否则返回 None。
+    """
+    segments = path[1:].split("/")
+    compiled: typing.List[typing.Union[str, typing.Tuple[bool, typing.Pattern]]] = []
+
+    for position, segment in enumerate(segments):
+        matches = list(PARAM_REGEX.finditer(segment))
+        if not matches:
+            compiled.append(segment)
+            continue
+
+        is_tail = False
+        segment_regex = "^"
+        idx = 0
+        for match in matches:
+            param_name = match.group(1)
+            convertor = param_convertors[param_name]
+            if isinstance(convertor, PathConvertor):
+                if position != len(segments) - 1:
+                    return None
+                is_tail = True
+            segment_regex += re.escape(segment[idx: match.start()])
+            segment_regex += f"(?P<{param_name}>{convertor.regex})"
+            idx = match.end()
+        segment_regex += re.escape(segment[idx:]) + "$"
+
+        compiled.append((is_tail, re.compile(segment_regex)))
+
+    return compiled
+
+
+class RadixTree:
+    """
+    由 Router.routes 构建的路由索引。
+    查找的开销只与 path 的深度有关，与路由数量无关；
+    Mount 被当作以 {path:path} 结尾的路由放进树里，前缀不匹配的请求不会进入它的子树；
+    不含参数的 Host 按主机名放在 hosts 中；
+    无法放入索引的路由（自定义的 BaseRoute 等）保存在 fallback 中，仍然按原有方式匹配。
+    """
+
+    def __init__(self, routes: typing.Sequence[typing.Any]) -> None:
+        self.root = RadixNode()
+        self.hosts: typing.Dict[str, typing.List[typing.Tuple[int, Host]]] = {}
+        self.fallback: typing.List[typing.Tuple[int, typing.Any]] = []
+
+        for index, route in enumerate(routes):
+            if not self.add(index, route):
+                self.fallback.append((index, route))
+
+    def add(self, index: int, route: typing.Any) -> bool:
+        if type(route).matches is Host.matches:
+            if route.param_convertors:
+                return False
+            self.hosts.setdefault(route.host.split(":")[0], []).append((index, route))
+            return True
+
+        # 重写了 matches 的子类无法保证与树的匹配规则一致
+        if type(route).matches not in INDEXED_MATCHES:
+            return False
+
+        path = route.path + "/{path:path}" if isinstance(route, Mount) else route.path
+        segments = compile_segments(path, route.param_convertors)
+        if segments is None:
+            return False
+
+        node = self.root
+        for segment in segments:
+            if isinstance(segment, str):
+                node = node.static.setdefault(segment, RadixNode())
+                continue
+
+            is_tail, pattern = segment
+            if is_tail:
+                node.tails.append((pattern, index, route))
+                return True
+
+            if pattern.pattern not in node.params:
+                node.params[pattern.pattern] = (pattern, RadixNode())
+            node = node.params[pattern.pattern][1]
+
+        node.routes.append((index, route))
+        return True
+
+    def lookup(self, path: str) -> typing.List[typing.Tuple[int, Route, typing.Dict[str, str]]]:
+        """ 返回所有结构上能够匹配 path 的 (下标, 路由, 未转换的参数)，按下标排序 """
+        found: typing.List[typing.Tuple[int, Route, typing.Dict[str, str]]] = []
+        if path.startswith("/"):
+            self._collect(self.root, path[1:].split("/"), 0, {}, found)
+            found.sort(key=lambda item: item[0])
+        return found
+
+    def _collect(
+            self,
+            node: RadixNode,
+            segments: typing.List[str],
+            depth: int,
+            params: typing.Dict[str, str],
+            found: typing.List[typing.Tuple[int, Route, typing.Dict[str, str]]],
+    ) -> None:
+        if depth == len(segments):
+            for index, route in node.routes:
+                found.append((index, route, params))
+            return
+
+        segment = segments[depth]
+
+        child = node.static.get(segment)
+        if child is not None:
+            self._collect(child, segments, depth + 1, params, found)
+
+        for pattern, child in node.params.values():
+            match = pattern.match(segment)
+            if match:
+                self._collect(child, segments, depth + 1, {**params, **match.groupdict()}, found)
+
+        if node.tails:
+            remainder = "/".join(segments[depth:])
+            for pattern, index, route in node.tails:
+                match = pattern.match(remainder)
+                if match:
+                    found.append((index, route, {**params, **match.groupdict()}))
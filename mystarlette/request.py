@@ -1,8 +1,16 @@
+import json
 import typing
 
 from starlette.type import Scope, Receive, Send, Message
-from starlette.utils import debug_print
-from starlette.datastructure import Headers
+from starlette.exception import HTTPException
+from starlette.datastructure import URL, Headers, QueryParams
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from starlette.tracing import RequestTrace
+
+
+class ClientDisconnect(Exception):
+    pass
 
 
 class HTTPConnection(typing.Mapping[str, typing.Any]):
@@ -14,8 +22,6 @@ class HTTPConnection(typing.Mapping[str, typing.Any]):
         # TODO question | why HTTPConnection class type in http or websocket
         assert scope["type"] in ("http", "websocket",)
 
-        debug_print("scope", scope)
-
         self.scope = scope
 
     def __getitem__(self, key: str) -> typing.Any:
@@ -27,6 +33,24 @@ class HTTPConnection(typing.Mapping[str, typing.Any]):
     def __len__(self) -> int:
         return len(self.scope)
 
+    @property
+    def url(self) -> URL:
+        if not hasattr(self, "_url"):
+            self._url = URL(scope=self.scope)
+        return self._url
+
+    @property
+    def base_url(self) -> URL:
+        """ 应用的根地址，生成绝对 url 时使用，同一个连接上只解析一次 """
+        if not hasattr(self, "_base_url"):
+            base_url_scope = dict(self.scope)
+            base_url_scope["path"] = "/"
+            # 在 Mount 中时 root_path 包含挂载前缀，url_for 生成的路径已经带有这个前缀
+            base_url_scope["root_path"] = self.scope.get("app_root_path", self.scope.get("root_path", ""))
+            base_url_scope["query_string"] = b""
+            self._base_url = URL(scope=base_url_scope)
+        return self._base_url
+
     @property
     def headers(self) -> Headers:
         if not hasattr(self, "_headers"):
@@ -36,13 +60,26 @@ class HTTPConnection(typing.Mapping[str, typing.Any]):
     @property
     def query_params(self) -> QueryParams:
         if not hasattr(self, "_query_params"):
-            self._query_params = QueryParams(self.scope["query_string"])
+            try:
+                self._query_params = QueryParams(self.scope["query_string"])
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Too many query parameters")
         return self._query_params
 
     @property
     def path_params(self) -> typing.Dict[str, typing.Any]:
         return self.scope.get("path_params", {})
 
+    @property
+    def trace(self) -> typing.Optional["RequestTrace"]:
+        """ 应用注册了 trace hook 时当前请求的 RequestTrace，其中的 traceparent 可以传递给下游服务 """
+        return self.scope.get("trace")
+
+    def url_for(self, name: str, /, **path_params: typing.Any) -> URL:
+        router = self.scope["router"]
+        url_path = router.url_path_for(name, **path_params)
+        return url_path.make_absolute_url(base_url=self.base_url)
+
 
 async def empty_receive() -> typing.NoReturn:
     raise RuntimeError("Receive channel has not been made available")
@@ -62,3 +99,73 @@ class Request(HTTPConnection):
         self._stream_consumed = False
         self._is_disconnected = False
 
+    @property
+    def receive(self) -> Receive:
+        return self._receive
+
+    async def stream(self) -> typing.AsyncGenerator[bytes, None]:
+        """ 逐个产出 http.request 消息中的 body，不做任何缓冲 """
+        # 请求体已经被 body() 读取过，直接返回缓存
+        # 缓存放在 scope 中，同一个请求上创建的其他 Request（例如中间件里的）也能读到
+        if "_body" in self.scope:
+            yield self.scope["_body"]
+            yield b""
+            return
+
+        if self._stream_consumed:
+            raise RuntimeError("Stream consumed")
+        self._stream_consumed = True
+
+        while True:
+            message = await self._receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                if body:
+                    yield body
+                if not message.get("more_body", False):
+                    break
+            elif message["type"] == "http.disconnect":
+                self._is_disconnected = True
+                raise ClientDisconnect()
+        yield b""
+
+    async def body(self) -> bytes:
+        """ 读取完整的请求体，只拼接一次并缓存，之后的读取不再产生拷贝 """
+        if "_body" not in self.scope:
+            chunks = [chunk async for chunk in self.stream()]
+            self.scope["_body"] = b"".join(chunks)
+        return self.scope["_body"]
+
+    async def json(self) -> typing.Any:
+        if not hasattr(self, "_json"):
+            # json.loads 可以直接解析 bytes，不需要先 decode 成 str
+            self._json = json.loads(await self.body())
+        return self._json
+
+
+class ProcessRequest:
+    """
+    传给进程池中 endpoint 的请求快照。
+    Request 持有 receive/send，无法 pickle；这里只保存可以 pickle 的原始数据，请求体会提前读取。
+    """
+
+    def __init__(self, scope: Scope, body: bytes) -> None:
+        self.method: str = scope["method"]
+        self.path: str = scope["path"]
+        self.path_params: typing.Dict[str, typing.Any] = dict(scope.get("path_params", {}))
+        self.query_string: bytes = scope.get("query_string", b"")
+        self.raw_headers: typing.List[typing.Tuple[bytes, bytes]] = list(scope["headers"])
+        self.body = body
+        trace = scope.get("trace")
+        self.traceparent: typing.Optional[str] = None if trace is None else trace.traceparent
+
+    @property
+    def headers(self) -> Headers:
+        return Headers(raw=self.raw_headers)
+
+    @property
+    def query_params(self) -> QueryParams:
+        return QueryParams(self.query_string)
+
+    def json(self) -> typing.Any:
+        return json.loads(self.body)
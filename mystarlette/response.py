@@ -1,11 +1,32 @@
-import json
+import os
+import stat
 import typing
+import mimetypes
+import functools
 from urllib.parse import quote
 
+import anyio
+
 from starlette.type import Scope, Receive, Send
-from starlette.datastructure import URL, MutableHeaders
+from starlette.background import BackgroundTask
+from starlette.serializer import JSONSerializer, get_serializer
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from starlette.datastructure import URL, Headers, MutableHeaders
+
 
-BackgroundTask = None
+# 常用的 content-type 头部，init_headers 直接复用，不再拼接 charset 和编码
+CONTENT_TYPE_TEXT = (b"content-type", b"text/plain; charset=utf-8")
+CONTENT_TYPE_HTML = (b"content-type", b"text/html; charset=utf-8")
+CONTENT_TYPE_JSON = (b"content-type", b"application/json")
+CONTENT_TYPE_NDJSON = (b"content-type", b"application/x-ndjson")
+CONTENT_TYPE_OCTET_STREAM = (b"content-type", b"application/octet-stream")
+CONTENT_TYPE_HEADERS: typing.Dict[typing.Tuple[str, str], typing.Tuple[bytes, bytes]] = {
+    ("text/plain", "utf-8"): CONTENT_TYPE_TEXT,
+    ("text/html", "utf-8"): CONTENT_TYPE_HTML,
+    ("application/json", "utf-8"): CONTENT_TYPE_JSON,
+    ("application/x-ndjson", "utf-8"): CONTENT_TYPE_NDJSON,
+    ("application/octet-stream", "utf-8"): CONTENT_TYPE_OCTET_STREAM,
+}
 
 
 class Response:
@@ -31,9 +52,11 @@ class Response:
 
     @property
     def headers(self) -> MutableHeaders:
-        if not hasattr(self, "_headers"):
-            self._headers = MutableHeaders(raw=self.raw_headers)
-        return self._headers
+        # raw_headers 可能被整个替换（例如 process_response），这时重新包装新的列表
+        headers = getattr(self, "_headers", None)
+        if headers is None or headers.raw is not self.raw_headers:
+            headers = self._headers = MutableHeaders(raw=self.raw_headers)
+        return headers
 
     def render(self, content: typing.Any) -> bytes:
         if content is None:
@@ -84,10 +107,13 @@ class Response:
 
         content_type = self.media_type
         if content_type is not None and populate_content_type:
-            if content_type.startswith("text/"):
-                # content_type += "; charset=" + self.charset
-                content_type = f"{content_type}; charset={self.charset}"
-            raw_headers.append((b"content-tpye", content_type.encode("latin-1")))
+            header = CONTENT_TYPE_HEADERS.get((content_type, self.charset))
+            if header is None:
+                if content_type.startswith("text/"):
+                    # content_type += "; charset=" + self.charset
+                    content_type = f"{content_type}; charset={self.charset}"
+                header = (b"content-type", content_type.encode("latin-1"))
+            raw_headers.append(header)
 
         # TODO feature add raw_headers in __init__
         self.raw_headers = raw_headers
@@ -105,11 +131,41 @@ class Response:
         await send({"type": "http.response.body", "body": self.body})
 
         # TODO question | whether background will block the overall program execution if background is cpu task
+        # TODO answer   | not any more, inside an application it is queued to app.background_executor
+        await self.run_background(scope)
+
+    async def prerender(self) -> None:
+        """ 在发送之前完成所有渲染工作，作为静态响应重复使用时只需要发送 """
+        pass
+
+    def freeze(self) -> "StaticResponse":
+        """ 返回内容相同、预先编码好的 StaticResponse，可以在所有请求之间共享 """
         if self.background is not None:
+            raise TypeError("A response with a background task cannot be frozen")
+        if not isinstance(getattr(self, "body", None), bytes):
+            raise TypeError(f"{self.__class__.__name__} has no complete body and cannot be frozen")
+        return StaticResponse(self.status_code, self.raw_headers, self.body)
+
+    async def run_background(self, scope: Scope) -> None:
+        """ 在应用中运行时交给应用的后台任务执行器，不占用当前连接；否则直接执行 """
+        if self.background is None:
+            return
+        executor = getattr(scope.get("app"), "background_executor", None)
+        if executor is None:
             await self.background()
+        else:
+            await executor.submit(self.background)
+
+
+# JSONResponse 推迟编码时传给 Response.__init__ 的占位内容
+_DEFERRED = object()
 
 
 class JSONResponse(Response):
+    """
+    较大的内容推迟到 __call__ 中在线程池里编码；
+    在此之前访问 body 时会在当前线程立即编码，body 永远是完整的响应体。
+    """
     media_type = "application/json"
 
     def __init__(
@@ -119,18 +175,76 @@ class JSONResponse(Response):
             # TODO question | why there use Dict up use Mapping
             headers: typing.Optional[typing.Dict[str, str]] = None,
             media_type: typing.Optional[str] = None,
-            background: typing.Optional[BackgroundTask] = None
+            background: typing.Optional[BackgroundTask] = None,
+            serializer: typing.Optional[JSONSerializer] = None,
     ):
-        super().__init__(content, status_code, headers, media_type, background)
+        # 没有指定时使用当前应用（Starlette.json_serializer）的序列化器
+        self.serializer = get_serializer() if serializer is None else serializer
+        self.content = content
+        self._deferred = False
+        deferred = self.serializer.should_offload(content)
+        # 推迟编码时先按空 body 初始化头部，content-length 在 set_body 中更新
+        super().__init__(_DEFERRED if deferred else content, status_code, headers, media_type, background)
+        self._deferred = deferred
+
+    @property  # type: ignore[override]
+    def body(self) -> bytes:
+        if self._deferred:
+            self.set_body(self.serializer.dumps(self.content))
+        return self._body
+
+    @body.setter
+    def body(self, body: bytes) -> None:
+        self._body = body
 
     def render(self, content: typing.Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-        ).encode("utf-8")
+        if content is _DEFERRED:
+            return b""
+        return self.serializer.dumps(content)
+
+    async def prerender(self) -> None:
+        if self._deferred:
+            self.set_body(await run_in_threadpool(self.serializer.dumps, self.content))
+
+    def set_body(self, body: bytes) -> None:
+        self.body = body
+        self._deferred = False
+        if not (self.status_code < 200 or self.status_code in (204, 304)):
+            self.headers["content-length"] = str(len(self.body))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.prerender()
+        await super().__call__(scope, receive, send)
+
+
+class StaticResponse(Response):
+    """
+    预先编码好的不可变响应，通常由 Response.freeze() 创建，可以作为模块级常量或直接作为 endpoint 共享。
+    headers 是元组，body 是 bytes，发送时只有两次 send，不再做任何编码；
+    每次发送都新建 message 字典和 headers 列表，middleware 修改 message 或 headers 不会影响其他请求。
+    """
+
+    def __init__(
+            self,
+            status_code: int,
+            raw_headers: typing.Iterable[typing.Tuple[bytes, bytes]],
+            body: bytes,
+    ) -> None:
+        self.status_code = status_code
+        self.raw_headers = tuple(raw_headers)
+        self.body = body
+        self.background = None
+
+    @property
+    def headers(self) -> Headers:  # type: ignore[override]
+        return Headers(raw=self.raw_headers)
+
+    def freeze(self) -> "StaticResponse":
+        return self
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": list(self.raw_headers)})
+        await send({"type": "http.response.body", "body": self.body})
 
 
 class HTMLResponse(Response):
@@ -151,3 +265,344 @@ class RedirectResponse(Response):
     ) -> None:
         super().__init__(content=b"", status_code=status_code, headers=headers, background=background)
         self.headers["location"] = quote(str(url), safe=":/%#?=@[]!$&'()*+,;")
+
+
+Content = typing.Union[str, bytes]
+SyncContentStream = typing.Iterable[Content]
+AsyncContentStream = typing.AsyncIterable[Content]
+ContentStream = typing.Union[AsyncContentStream, SyncContentStream]
+
+
+class StreamingResponse(Response):
+    """
+    分块发送的响应，每个元素作为一个 more_body=True 的 http.response.body 发送。
+    同步迭代器放到线程池中迭代；每次 send 都要等待服务器写出后才会取下一块，天然形成背压。
+    """
+
+    def __init__(
+            self,
+            content: ContentStream,
+            status_code: int = 200,
+            headers: typing.Optional[typing.Mapping[str, str]] = None,
+            media_type: typing.Optional[str] = None,
+            background: typing.Optional[BackgroundTask] = None,
+    ) -> None:
+        if isinstance(content, typing.AsyncIterable):
+            self.body_iterator = content
+        else:
+            self.body_iterator = iterate_in_threadpool(content)
+        self.status_code = status_code
+        self.media_type = self.media_type if media_type is None else media_type
+        self.background = background
+        self.init_headers(headers)
+
+    async def listen_for_disconnect(self, receive: Receive) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+
+    async def stream_response(self, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        async for chunk in self.body_iterator:
+            if not isinstance(chunk, bytes):
+                chunk = chunk.encode(self.charset)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # 客户端断开连接后立即停止迭代，不再生成后续的内容
+        async with anyio.create_task_group() as task_group:
+
+            async def wrap(func: typing.Callable[[], typing.Awaitable[None]]) -> None:
+                await func()
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(wrap, functools.partial(self.stream_response, send))
+            await wrap(functools.partial(self.listen_for_disconnect, receive))
+
+        await self.run_background(scope)
+
+
+class JSONStreamEncoder:
+    """
+    逐个元素编码 JSON 数组或 NDJSON。
+    已编码的内容在缓冲区中累积到 buffer_size 字节后才产出一块，因此占用的内存与结果的总大小无关。
+    dumps 默认使用当前应用的序列化器。
+    """
+
+    def __init__(
+            self,
+            ndjson: bool = False,
+            buffer_size: int = 64 * 1024,
+            dumps: typing.Optional[typing.Callable[[typing.Any], bytes]] = None,
+    ) -> None:
+        self.ndjson = ndjson
+        self.buffer_size = buffer_size
+        self.dumps = get_serializer().dumps if dumps is None else dumps
+
+    def encode(self, iterable: typing.Iterable[typing.Any]) -> typing.Iterator[bytes]:
+        buffer = _JSONStreamBuffer(self)
+        for item in iterable:
+            chunk = buffer.add(item)
+            if chunk is not None:
+                yield chunk
+        chunk = buffer.close()
+        if chunk:
+            yield chunk
+
+    async def aencode(self, iterable: typing.AsyncIterable[typing.Any]) -> typing.AsyncIterator[bytes]:
+        buffer = _JSONStreamBuffer(self)
+        async for item in iterable:
+            chunk = buffer.add(item)
+            if chunk is not None:
+                yield chunk
+        chunk = buffer.close()
+        if chunk:
+            yield chunk
+
+
+class _JSONStreamBuffer:
+    """ 一次编码过程的状态：负责分隔符、数组的方括号以及按 buffer_size 分块 """
+
+    def __init__(self, encoder: JSONStreamEncoder) -> None:
+        self.encoder = encoder
+        self.parts: typing.List[bytes] = [] if encoder.ndjson else [b"["]
+        self.size = len(self.parts)
+        self.first = True
+
+    def add(self, item: typing.Any) -> typing.Optional[bytes]:
+        """ 编码一个元素，缓冲区满时返回要产出的一块 """
+        encoder = self.encoder
+        part = encoder.dumps(item)
+        if encoder.ndjson:
+            part += b"\n"
+        elif not self.first:
+            part = b"," + part
+        self.first = False
+        self.parts.append(part)
+        self.size += len(part)
+        if self.size < encoder.buffer_size:
+            return None
+        chunk = b"".join(self.parts)
+        self.parts, self.size = [], 0
+        return chunk
+
+    def close(self) -> bytes:
+        if not self.encoder.ndjson:
+            self.parts.append(b"]")
+        return b"".join(self.parts)
+
+
+class JSONStreamingResponse(StreamingResponse):
+    """ 以 JSON 数组（或 ndjson=True 时以 NDJSON）的形式流式返回一个（异步）可迭代对象 """
+    media_type = "application/json"
+
+    def __init__(
+            self,
+            content: typing.Union[typing.Iterable[typing.Any], typing.AsyncIterable[typing.Any]],
+            status_code: int = 200,
+            headers: typing.Optional[typing.Mapping[str, str]] = None,
+            media_type: typing.Optional[str] = None,
+            background: typing.Optional[BackgroundTask] = None,
+            ndjson: bool = False,
+            buffer_size: int = 64 * 1024,
+    ) -> None:
+        if ndjson and media_type is None:
+            media_type = "application/x-ndjson"
+        encoder = JSONStreamEncoder(ndjson=ndjson, buffer_size=buffer_size)
+        # 同步的可迭代对象连同编码一起放到线程池中，每次跨线程得到的是一整块而不是一个元素
+        if isinstance(content, typing.AsyncIterable):
+            stream: ContentStream = encoder.aencode(content)
+        else:
+            stream = encoder.encode(content)
+        super().__init__(stream, status_code, headers, media_type, background)
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """ 由修改时间和文件大小生成 ETag，不需要读取文件内容 """
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_range(range_header: str, size: int) -> typing.Optional[typing.Tuple[int, int]]:
+    """
+    解析单个 bytes range，返回 [start, end) 区间。
+    格式不合法（包括 last < first）或者是多段 range 时返回 None（忽略 Range，返回完整内容，RFC 9110 §14.1.1）；
+    无法满足的 range 返回 (size, size)，由调用方返回 416。
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start_str, sep, end_str = ranges.strip().partition("-")
+    start_str, end_str = start_str.strip(), end_str.strip()
+    if not sep or not (start_str.isdigit() or end_str.isdigit()):
+        return None
+    if (start_str and not start_str.isdigit()) or (end_str and not end_str.isdigit()):
+        return None
+
+    if not start_str:
+        # bytes=-500 表示最后 500 个字节
+        suffix = int(end_str)
+        if suffix == 0:
+            return size, size
+        return max(size - suffix, 0), size
+
+    start = int(start_str)
+    if end_str and int(end_str) < start:
+        return None
+    end = size if not end_str else min(int(end_str) + 1, size)
+    if start >= size or start >= end:
+        return size, size
+    return start, end
+
+
+class FileResponse(Response):
+    """
+    发送文件的响应，支持 Range/If-Range。
+    服务器支持 http.response.zerocopysend 扩展时直接交给服务器 sendfile，
+    否则在线程池中按 chunk_size 分块读取并发送，文件内容不会整个读入内存，磁盘读取也不会阻塞事件循环。
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(
+            self,
+            path: typing.Union[str, "os.PathLike[str]"],
+            status_code: int = 200,
+            headers: typing.Optional[typing.Mapping[str, str]] = None,
+            media_type: typing.Optional[str] = None,
+            background: typing.Optional[BackgroundTask] = None,
+            filename: typing.Optional[str] = None,
+            stat_result: typing.Optional[os.stat_result] = None,
+            method: typing.Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self.status_code = status_code
+        self.filename = filename
+        self.send_header_only = method is not None and method.upper() == "HEAD"
+        if media_type is None:
+            media_type = mimetypes.guess_type(filename or path)[0] or "text/plain"
+        self.media_type = media_type
+        self.background = background
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+        if self.filename is not None:
+            content_disposition_filename = quote(self.filename)
+            if content_disposition_filename != self.filename:
+                content_disposition = f"attachment; filename*=utf-8''{content_disposition_filename}"
+            else:
+                content_disposition = f'attachment; filename="{self.filename}"'
+            self.headers["content-disposition"] = content_disposition
+        self.stat_result = stat_result
+        if stat_result is not None:
+            self.set_stat_headers(stat_result)
+
+    def set_stat_headers(self, stat_result: os.stat_result) -> None:
+        from email.utils import formatdate
+
+        self.headers["content-length"] = str(stat_result.st_size)
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        self.headers["etag"] = file_etag(stat_result)
+
+    def _requested_range(self, scope: Scope, size: int) -> typing.Optional[typing.Tuple[int, int]]:
+        range_header = if_range = None
+        for key, value in scope.get("headers", []):
+            if key == b"range":
+                range_header = value.decode("latin-1")
+            elif key == b"if-range":
+                if_range = value.decode("latin-1")
+
+        if range_header is None or self.status_code != 200:
+            return None
+        # If-Range 与当前的 ETag 或 Last-Modified 不一致时，说明文件已经变化，返回完整内容
+        if if_range is not None and if_range.strip() not in (self.headers["etag"], self.headers["last-modified"]):
+            return None
+        return parse_range(range_header, size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            try:
+                stat_result = await run_in_threadpool(os.stat, self.path)
+                self.stat_result = stat_result
+                self.set_stat_headers(stat_result)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+            else:
+                if not stat.S_ISREG(stat_result.st_mode):
+                    raise RuntimeError(f"File at path {self.path} is not a file.")
+
+        size = self.stat_result.st_size
+        start, end = 0, size
+        status_code = self.status_code
+        raw_headers = self.raw_headers
+
+        requested = self._requested_range(scope, size)
+        if requested is not None:
+            start, end = requested
+            raw_headers = list(raw_headers)
+            headers = MutableHeaders(raw=raw_headers)
+            if start >= size:
+                # 416 Range Not Satisfiable
+                status_code = 416
+                headers["content-range"] = f"bytes */{size}"
+                headers["content-length"] = "0"
+                start = end = 0
+            else:
+                # 206 Partial Content
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+                headers["content-length"] = str(end - start)
+
+        await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+
+        if self.send_header_only or start == end:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            await self._send_zerocopy(send, start, end)
+        else:
+            await self._send_chunks(send, start, end)
+
+        await self.run_background(scope)
+
+    async def _send_zerocopy(self, send: Send, start: int, end: int) -> None:
+        file = await run_in_threadpool(open, self.path, "rb")
+        try:
+            await send(
+                {
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": start,
+                    "count": end - start,
+                    "more_body": False,
+                }
+            )
+        finally:
+            await run_in_threadpool(file.close)
+
+    async def _send_chunks(self, send: Send, start: int, end: int) -> None:
+        file = await run_in_threadpool(open, self.path, "rb")
+        try:
+            offset = start
+            while offset < end:
+                chunk = await run_in_threadpool(_read_chunk, file, offset, min(self.chunk_size, end - offset))
+                if not chunk:
+                    # 发送时文件已经被截断
+                    break
+                offset += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+            if offset < end:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await run_in_threadpool(file.close)
+
+
+def _read_chunk(file: typing.BinaryIO, offset: int, size: int) -> bytes:
+    file.seek(offset)
+    return file.read(size)
@@ -1,17 +1,22 @@
 import re
+import time
+import pickle
 import typing
 import inspect
 import functools
 from enum import Enum
 
-from starlette.type import ASGIApp, Scope, Receive, Send
-from starlette.utils import is_async_callable, debug_print
-from starlette.request import Request
-from starlette.response import PlainTextResponse
+import anyio
+
+from starlette.type import ASGIApp, Scope, Receive, Send, Message
+from starlette.utils import is_async_callable, collapse_excgroups
+from starlette.request import Request, ProcessRequest
+from starlette.response import Response, PlainTextResponse
+from starlette.serializer import JSONSerializer, serializer_context, get_serializer
 from starlette.convertor import Convertor, CONVERTOR_TYPES
 from starlette.exception import HTTPException
-from starlette.websocket import WebSocketClose
-from starlette.concurrency import run_in_threadpool
+from starlette.websocket import WebSocket, WebSocketClose
+from starlette.concurrency import ThreadLimiter, run_in_threadpool, default_process_executor
 from starlette.datastructure import URLPath
 
 
@@ -21,19 +26,174 @@ class Match(Enum):
     FULL = 2
 
 
-def request_response(func: typing.Callable) -> ASGIApp:
-    """ 接收一个 函数 或 协程，并且返回一个 ASGI application """
+def request_response(
+        func: typing.Callable,
+        thread_limiter: typing.Optional[ThreadLimiter] = None,
+) -> ASGIApp:
+    """
+    接收一个 函数 或 协程，并且返回一个 ASGI application
+    同步函数默认使用应用的线程池 limiter，指定 thread_limiter 时使用路由自己的
+    """
     is_coroutine = is_async_callable(func)
+    run_sync = run_in_threadpool if thread_limiter is None else thread_limiter.run
+
+    async def call_endpoint(request: Request) -> Response:
+        # 如果给到的函数是协程（异步函数），将请求传入得到响应
+        # 如果给到的函数不是协程（异步函数），在线程池中执行
+        if is_coroutine:
+            return await func(request)
+        return await run_sync(func, request)
 
     async def app(scope: Scope, receive: Receive, send: Send) -> None:
         request = Request(scope, receive=receive, send=send)
+        trace = scope.get("trace")
+        if trace is None:
+            response = await call_endpoint(request)
+        else:
+            response = await traced_call(trace, func, call_endpoint, request)
+        await response(scope, receive, send)
 
-        # 如果给到的函数是协程（异步函数），将请求传入得到响应
-        # 如果给到的函数不是协程（异步函数），
-        if is_coroutine:
-            response = await func(request)
+    return app
+
+
+def limit_body_size(app: ASGIApp, max_body_size: int) -> ASGIApp:
+    """
+    限制请求体大小的 ASGI 包装，对任何 app 都有效，超过时返回 413。
+    有 content-length 时在调用 app 之前检查，没有时（chunked）在 app 读取请求体时计数。
+    在应用中时抛出 HTTPException 交给异常处理器，否则直接发送 413 响应。
+    """
+
+    async def wrapped(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await app(scope, receive, send)
+            return
+
+        for key, value in scope["headers"]:
+            if key == b"content-length":
+                if value.isdigit() and int(value) > max_body_size:
+                    if "app" in scope:
+                        raise HTTPException(status_code=413)
+                    await PlainTextResponse("Request Entity Too Large", status_code=413)(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise HTTPException(status_code=413)
+            return message
+
+        if "app" in scope:
+            await app(scope, limited_receive, send)
+            return
+        try:
+            await app(scope, limited_receive, send)
+        except HTTPException as exc:
+            # 不在应用中时没有异常处理器，由这里把超限的异常转换成响应
+            if exc.status_code != 413 or received <= max_body_size:
+                raise
+            await PlainTextResponse("Request Entity Too Large", status_code=413)(scope, receive, send)
+
+    return wrapped
+
+
+def websocket_session(func: typing.Callable[[WebSocket], typing.Awaitable[None]]) -> ASGIApp:
+    """ 接收一个以 WebSocket 为参数的协程，并且返回一个 ASGI application """
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        session = WebSocket(scope, receive=receive, send=send)
+        # writer 运行在连接自己的 task group 中，endpoint 的异常保持原来的类型向上抛出
+        with collapse_excgroups():
+            async with anyio.create_task_group() as task_group:
+                session.start_writer(task_group)
+                try:
+                    await func(session)
+                    # endpoint 返回后服务器会关闭连接，先把发送队列中剩余的消息发出去
+                    await session.flush()
+                finally:
+                    # endpoint 抛出异常或被取消时，丢弃剩余的消息并取消 writer；正常结束时只是让 writer 退出
+                    await session.abort()
+
+    return app
+
+
+async def traced_call(
+        trace: typing.Any,
+        endpoint: typing.Callable,
+        call: typing.Callable[..., typing.Awaitable[typing.Any]],
+        *args: typing.Any,
+) -> typing.Any:
+    """ 在 handler_start 和 handler_end 事件之间执行 endpoint """
+    trace.emit("handler_start", endpoint=endpoint)
+    start = time.perf_counter()
+    try:
+        result = await call(*args)
+    except BaseException as exc:
+        trace.emit("handler_end", endpoint=endpoint, duration=time.perf_counter() - start, exc=exc)
+        raise
+    trace.emit("handler_end", endpoint=endpoint, duration=time.perf_counter() - start, exc=None)
+    return result
+
+
+def _call_in_process(
+        func: typing.Callable,
+        request: ProcessRequest,
+        serializer: JSONSerializer,
+) -> typing.Tuple[str, typing.Tuple[typing.Any, ...]]:
+    """
+    在子进程中执行 endpoint，只把 (status, raw_headers, body) 这些基础类型传回主进程。
+    HTTPException 以及无法 pickle 的异常会被转换，保证主进程能够拿到清晰的错误。
+    serializer 是主进程中应用的序列化器的副本，注册过的 type_encoders 在子进程中同样有效。
+    """
+    # 子进程中没有事件循环需要保护，JSON 直接在这里编码
+    serializer.offload_threshold = None
+    serializer_context.set(serializer)
+    try:
+        response = func(request)
+    except HTTPException as exc:
+        return "http_exception", (exc.status_code, exc.detail, exc.headers)
+    except Exception as exc:
+        try:
+            pickle.dumps(exc)
+        except Exception:
+            raise RuntimeError(f"{type(exc).__name__}: {exc}") from None
+        raise
+
+    if not isinstance(response, Response) or not isinstance(getattr(response, "body", None), bytes):
+        raise TypeError(
+            f"Endpoint {get_name(func)} running in a process must return a Response with a complete body, "
+            f"got {type(response).__name__}"
+        )
+    if response.background is not None:
+        raise TypeError(f"Endpoint {get_name(func)} running in a process cannot use background tasks")
+    return "response", (response.status_code, response.raw_headers, response.body)
+
+
+def process_response(func: typing.Callable) -> ASGIApp:
+    """ 与 request_response 相同，但同步的 endpoint 在应用的进程池中执行，不会与其他请求争抢 GIL """
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        request = Request(scope, receive=receive, send=send)
+        body = await request.body()
+
+        executor = scope["app"].process_executor if "app" in scope else default_process_executor
+        args = (_call_in_process, func, ProcessRequest(scope, body), get_serializer())
+        trace = scope.get("trace")
+        if trace is not None:
+            kind, payload = await traced_call(trace, func, executor.run, *args)
         else:
-            response = await run_in_threadpool(func, request)
+            kind, payload = await executor.run(*args)
+        if kind == "http_exception":
+            raise HTTPException(*payload)
+
+        status_code, raw_headers, content = payload
+        response = Response(content, status_code=status_code)
+        response.raw_headers = raw_headers
         await response(scope, receive, send)
 
     return app
@@ -51,7 +211,7 @@ class BaseRoute:
     def matches(self, scope: Scope) -> typing.Tuple[Match, Scope]:
         raise NotImplementedError()
 
-    def url_path_for(self, name: str, **path_params: typing.Any) -> URLPath:
+    def url_path_for(self, name: str, /, **path_params: typing.Any) -> URLPath:
         raise NotImplementedError()
 
     async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
@@ -117,7 +277,7 @@ def compile_path(path: str) -> typing.Tuple[typing.Pattern, str, typing.Dict[str
 
     if is_host:
         hostname = path[idx:].split(":")[0]
-        path_regex += re.escap(hostname) + "$"
+        path_regex += re.escape(hostname) + "$"
     else:
         path_regex += re.escape(path[idx:]) + "$"
 
@@ -126,6 +286,42 @@ def compile_path(path: str) -> typing.Tuple[typing.Pattern, str, typing.Dict[str
     return re.compile(path_regex), path_format, param_convertors
 
 
+class NoMatchFound(Exception):
+    """ url_path_for 找不到对应名称和参数的路由 """
+
+    def __init__(self, name: str, path_params: typing.Dict[str, typing.Any]) -> None:
+        params = ", ".join(list(path_params.keys()))
+        super().__init__(f'No route exists for name "{name}" and params "{params}".')
+
+
+FORMAT_PARAM_REGEX = re.compile("{([a-zA-Z_][a-zA-Z0-9_]*)}")
+
+
+def compile_path_formatter(
+        path_format: str,
+        param_convertors: typing.Dict[str, Convertor],
+) -> typing.Callable[[typing.Dict[str, typing.Any]], str]:
+    """
+    将 path_format 预先拆分为静态部分和参数，生成 url 时只需要调用 to_string 并拼接字符串。
+    re.split 的结果中，偶数下标是静态部分，奇数下标是参数名。
+    """
+    parts = FORMAT_PARAM_REGEX.split(path_format)
+    statics = parts[0::2]
+    params = [(name, param_convertors[name].to_string) for name in parts[1::2]]
+
+    if not params:
+        return lambda path_params: path_format
+
+    def formatter(path_params: typing.Dict[str, typing.Any]) -> str:
+        result = [statics[0]]
+        for (name, to_string), static in zip(params, statics[1:]):
+            result.append(to_string(path_params[name]))
+            result.append(static)
+        return "".join(result)
+
+    return formatter
+
+
 class Route(BaseRoute):
 
     def __init__(
@@ -136,6 +332,12 @@ class Route(BaseRoute):
             methods: typing.Optional[typing.List[str]] = None,
             name: typing.Optional[str] = None,
             include_in_schema: bool = True,
+            # 请求体的最大字节数，超过时返回 413，None 表示不限制
+            max_body_size: typing.Optional[int] = None,
+            # 同步 endpoint 使用的线程池容量，可以传入 ThreadLimiter 以便多个路由共用，None 表示使用应用的 limiter
+            thread_limiter: typing.Optional[typing.Union[int, ThreadLimiter]] = None,
+            # "thread"：同步 endpoint 在线程池中执行；"process"：在应用的进程池中执行，适合 CPU 密集型的 endpoint
+            executor: str = "thread",
     ) -> None:
         assert path.startswith("/"), "Route path must start with '/'"
 
@@ -145,6 +347,10 @@ class Route(BaseRoute):
         self.endpoint = endpoint
         # 路由名称
         self.name = get_name(endpoint) if name is None else name
+        self.max_body_size = max_body_size
+        if isinstance(thread_limiter, int):
+            thread_limiter = ThreadLimiter(thread_limiter, name=self.name)
+        self.thread_limiter = thread_limiter
 
         # TODO question | why use endpoint_handler to wrapper endpoint
         # TODO answer   | maybe don't want to destroy endpoint
@@ -154,23 +360,51 @@ class Route(BaseRoute):
         while isinstance(endpoint_handler, functools.partial):
             endpoint_handler = endpoint_handler.func
 
+        assert executor in ("thread", "process"), "executor must be 'thread' or 'process'"
+        self.executor = executor
+
+        if executor == "process":
+            assert not is_async_callable(endpoint), "Only sync endpoints can run in a process pool"
+            try:
+                pickle.dumps(endpoint)
+            except Exception as exc:
+                raise TypeError(
+                    f"Endpoint {self.name} cannot run in a process pool because it cannot be pickled: {exc}. "
+                    "Use a module-level function."
+                ) from exc
+
         # 如果 endpoint_handler 是一个函数或方法
         if inspect.isfunction(endpoint_handler) or inspect.ismethod(endpoint_handler):
-            self.app = request_response(endpoint)
+            if executor == "process":
+                self.app = process_response(endpoint)
+            else:
+                self.app = request_response(endpoint, thread_limiter=thread_limiter)
             if methods is None:
                 methods = ["GET"]
         else:
             self.app = endpoint
+        if max_body_size is not None:
+            # 在 ASGI 层限制，endpoint 是类或者 ASGI app 时同样有效
+            self.app = limit_body_size(self.app, max_body_size)
 
         if methods is None:
             self.methods = None
+            self.allow_headers: typing.Optional[typing.Dict[str, str]] = None
+            self.method_not_allowed: typing.Optional[Response] = None
         else:
             self.methods = {method.upper() for method in methods}
             # TODO question | what's mean
             if "GET" in self.methods:
                 self.methods.add("HEAD")
+            # 405 响应的 Allow 头部以及响应本身只生成一次
+            self.allow_headers = {"Allow": ", ".join(self.methods)}
+            self.method_not_allowed = PlainTextResponse(
+                "Method Not Allowed", status_code=405, headers=self.allow_headers,
+            ).freeze()
 
         self.path_regex, self.path_format, self.param_convertors = compile_path(path)
+        self.param_names = frozenset(self.param_convertors)
+        self.url_formatter = compile_path_formatter(self.path_format, self.param_convertors)
 
     def matches(self, scope: Scope) -> typing.Tuple[Match, Scope]:
         if scope["type"] == "http":
@@ -178,31 +412,274 @@ class Route(BaseRoute):
             match = self.path_regex.match(scope["path"])
 
             if match:
-                matched_params = match.groupdict()
-                for key, value in matched_params.items():
-                    # TODO question | what's means
-                    matched_params[key] = self.param_convertors[key].convert(value)
-                path_params = dict(scope.get("path_params", ""))
-                # TODO question | why do this
-                path_params.update(matched_params)
-                child_scope = {"endpoint": self.endpoint, "path_params": path_params}
-                # TODO question | what's mearns
-                if self.methods and scope["method"] not in self.methods:
-                    return Match.PARTIAL, child_scope
-                else:
-                    return Match.FULL, child_scope
+                return self.match_params(scope, match.groupdict())
         return Match.NONE, {}
 
-    def url_path_for(self, name: str, **path_params: typing.Any) -> URLPath:
-        pass
+    def match_params(self, scope: Scope, matched_params: typing.Dict[str, str]) -> typing.Tuple[Match, Scope]:
+        """ 在 path 已经匹配的前提下转换参数并判断匹配程度，Router 的路由索引命中后直接调用这里 """
+        if scope["type"] != "http":
+            return Match.NONE, {}
+
+        matched_params = dict(matched_params)
+        for key, value in matched_params.items():
+            # TODO question | what's means
+            matched_params[key] = self.param_convertors[key].convert(value)
+        path_params = dict(scope.get("path_params", ""))
+        # TODO question | why do this
+        path_params.update(matched_params)
+        child_scope = {"endpoint": self.endpoint, "path_params": path_params}
+        # TODO question | what's mearns
+        if self.methods and scope["method"] not in self.methods:
+            return Match.PARTIAL, child_scope
+        else:
+            return Match.FULL, child_scope
+
+    async def warmup(self) -> None:
+        """ endpoint 本身是一个响应对象时，提前完成它的渲染 """
+        if isinstance(self.endpoint, Response):
+            await self.endpoint.prerender()
+
+    def url_path_for(self, name: str, /, **path_params: typing.Any) -> URLPath:
+        if name != self.name or path_params.keys() != self.param_names:
+            raise NoMatchFound(name, path_params)
+
+        return URLPath(path=self.url_formatter(path_params), protocol="http")
 
     async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
         if self.methods and scope["method"] not in self.methods:
-            headers = {"Allow": ", ".join(self.methods)}
-            if "app" in scope:
-                raise HTTPException(status_code=405, headers=headers)
-            else:
-                response = PlainTextResponse("Method Not Allowed", status_code=405, headers=headers)
-            await response(scope, receive, send)
+            # 在应用中并且注册了 405 处理器时才抛出异常，否则直接发送预先渲染好的响应
+            if "app" in scope and 405 not in getattr(scope.get("router"), "prerendered_statuses", ()):
+                raise HTTPException(status_code=405, headers=dict(self.allow_headers))
+            await self.method_not_allowed(scope, receive, send)
         else:
             await self.app(scope, receive, send)
+
+
+def iter_routes(routes: typing.Iterable[BaseRoute]) -> typing.Iterator[BaseRoute]:
+    """ 依次产出 routes 中的路由，Mount 和 Host 中的子路由也会被产出 """
+    for route in routes:
+        yield route
+        children = getattr(route, "routes", None)
+        if children:
+            yield from iter_routes(children)
+
+
+def get_hostname(scope: Scope) -> str:
+    """ Host 头部中去掉端口的主机名，没有 Host 头部时返回空字符串 """
+    for key, value in scope.get("headers", ()):
+        if key == b"host":
+            return value.decode("latin-1").split(":")[0]
+    return ""
+
+
+class WebSocketRoute(BaseRoute):
+
+    def __init__(self, path: str, endpoint: typing.Callable, *, name: typing.Optional[str] = None) -> None:
+        assert path.startswith("/"), "Route path must start with '/'"
+        self.path = path
+        self.endpoint = endpoint
+        self.name = get_name(endpoint) if name is None else name
+
+        endpoint_handler = endpoint
+        while isinstance(endpoint_handler, functools.partial):
+            endpoint_handler = endpoint_handler.func
+        # 函数或方法以 WebSocket 为参数，其他对象当作 ASGI application 直接使用
+        if inspect.isfunction(endpoint_handler) or inspect.ismethod(endpoint_handler):
+            self.app = websocket_session(endpoint)
+        else:
+            self.app = endpoint
+
+        self.path_regex, self.path_format, self.param_convertors = compile_path(path)
+        self.param_names = frozenset(self.param_convertors)
+        self.url_formatter = compile_path_formatter(self.path_format, self.param_convertors)
+
+    def matches(self, scope: Scope) -> typing.Tuple[Match, Scope]:
+        if scope["type"] == "websocket":
+            match = self.path_regex.match(scope["path"])
+            if match:
+                return self.match_params(scope, match.groupdict())
+        return Match.NONE, {}
+
+    def match_params(self, scope: Scope, matched_params: typing.Dict[str, str]) -> typing.Tuple[Match, Scope]:
+        if scope["type"] != "websocket":
+            return Match.NONE, {}
+
+        path_params = dict(scope.get("path_params", ""))
+        for key, value in matched_params.items():
+            path_params[key] = self.param_convertors[key].convert(value)
+        return Match.FULL, {"endpoint": self.endpoint, "path_params": path_params}
+
+    def url_path_for(self, name: str, /, **path_params: typing.Any) -> URLPath:
+        if name != self.name or path_params.keys() != self.param_names:
+            raise NoMatchFound(name, path_params)
+
+        return URLPath(path=self.url_formatter(path_params), protocol="websocket")
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.app(scope, receive, send)
+
+
+class Mount(BaseRoute):
+    """
+    把 path 前缀下的所有请求交给一个子应用或者由 routes 构成的子 Router。
+    子应用看到的 path 是去掉前缀之后的部分，前缀被追加到 root_path 上。
+    静态前缀的 Mount 会被放进上层 Router 的路由索引，前缀不匹配时整棵子树只需要一次 dict 查找就被跳过。
+    """
+
+    def __init__(
+            self,
+            path: str,
+            app: typing.Optional[ASGIApp] = None,
+            routes: typing.Optional[typing.Sequence[BaseRoute]] = None,
+            name: typing.Optional[str] = None,
+    ) -> None:
+        assert path == "" or path.startswith("/"), "Routed paths must start with '/'"
+        assert app is not None or routes is not None, "Either 'app=...', or 'routes=' must be specified"
+        self.path = path.rstrip("/")
+        if app is None:
+            # router 依赖 route，只能在这里导入
+            from starlette.router import Router
+            app = Router(routes=routes)
+        self.app = app
+        self.name = name
+
+        # 剩余的部分作为 path 类型的参数匹配，路由索引也把它当作以 path 参数结尾的路由
+        self.path_regex, self.path_format, self.param_convertors = compile_path(self.path + "/{path:path}")
+        self.prefix_names = frozenset(self.param_convertors) - {"path"}
+        self.url_formatter = compile_path_formatter(self.path_format, self.param_convertors)
+
+    @property
+    def routes(self) -> typing.List[BaseRoute]:
+        return getattr(self.app, "routes", [])
+
+    def matches(self, scope: Scope) -> typing.Tuple[Match, Scope]:
+        if scope["type"] in ("http", "websocket"):
+            match = self.path_regex.match(scope["path"])
+            if match:
+                return self.match_params(scope, match.groupdict())
+        return Match.NONE, {}
+
+    def match_params(self, scope: Scope, matched_params: typing.Dict[str, str]) -> typing.Tuple[Match, Scope]:
+        if scope["type"] not in ("http", "websocket"):
+            return Match.NONE, {}
+
+        path_params = dict(scope.get("path_params", ""))
+        for key, value in matched_params.items():
+            if key != "path":
+                path_params[key] = self.param_convertors[key].convert(value)
+        path = scope["path"]
+        remaining_path = "/" + matched_params["path"]
+        matched_path = path[: len(path) - len(remaining_path)]
+        root_path = scope.get("root_path", "")
+        child_scope = {
+            "path_params": path_params,
+            # 应用自身的 root_path，生成绝对 url 时使用
+            "app_root_path": scope.get("app_root_path", root_path),
+            "root_path": root_path + matched_path,
+            "path": remaining_path,
+            "endpoint": self.app,
+        }
+        return Match.FULL, child_scope
+
+    async def warmup(self) -> None:
+        app_warmup = getattr(self.app, "warmup", None)
+        if app_warmup is not None:
+            await app_warmup()
+
+    def url_path_for(self, name: str, /, **path_params: typing.Any) -> URLPath:
+        if self.name is not None and name == self.name and "path" in path_params:
+            # 直接生成 Mount 自身的 url，path 是子应用中的路径
+            if path_params.keys() != self.prefix_names | {"path"}:
+                raise NoMatchFound(name, path_params)
+            path_params = dict(path_params, path=path_params["path"].lstrip("/"))
+            return URLPath(path=self.url_formatter(path_params))
+
+        if (self.name is None or name.startswith(self.name + ":")) and self.prefix_names <= path_params.keys():
+            remaining_name = name if self.name is None else name[len(self.name) + 1:]
+            prefix_params = {key: path_params[key] for key in self.prefix_names}
+            remaining_params = {key: value for key, value in path_params.items() if key not in self.prefix_names}
+            prefix = self.url_formatter(dict(prefix_params, path="")).rstrip("/")
+            for route in self.routes:
+                try:
+                    url = route.url_path_for(remaining_name, **remaining_params)
+                    return URLPath(path=prefix + str(url), protocol=url.protocol)
+                except NoMatchFound:
+                    pass
+        raise NoMatchFound(name, path_params)
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.app(scope, receive, send)
+
+
+class Host(BaseRoute):
+    """
+    按 Host 头部中的主机名分发到子应用或者由 routes 构成的子 Router，host 中可以使用参数。
+    不含参数的 Host 在上层 Router 中按主机名建立索引，其他主机名的请求只需要一次 dict 查找就被跳过。
+    """
+
+    def __init__(
+            self,
+            host: str,
+            app: typing.Optional[ASGIApp] = None,
+            routes: typing.Optional[typing.Sequence[BaseRoute]] = None,
+            name: typing.Optional[str] = None,
+    ) -> None:
+        assert not host.startswith("/"), "Host must not start with '/'"
+        assert app is not None or routes is not None, "Either 'app=...', or 'routes=' must be specified"
+        self.host = host
+        if app is None:
+            from starlette.router import Router
+            app = Router(routes=routes)
+        self.app = app
+        self.name = name
+
+        self.host_regex, self.host_format, self.param_convertors = compile_path(host)
+        self.param_names = frozenset(self.param_convertors)
+        self.host_formatter = compile_path_formatter(self.host_format, self.param_convertors)
+
+    @property
+    def routes(self) -> typing.List[BaseRoute]:
+        return getattr(self.app, "routes", [])
+
+    def matches(self, scope: Scope) -> typing.Tuple[Match, Scope]:
+        if scope["type"] in ("http", "websocket"):
+            match = self.host_regex.match(get_hostname(scope))
+            if match:
+                return self.match_params(scope, match.groupdict())
+        return Match.NONE, {}
+
+    def match_params(self, scope: Scope, matched_params: typing.Dict[str, str]) -> typing.Tuple[Match, Scope]:
+        if scope["type"] not in ("http", "websocket"):
+            return Match.NONE, {}
+
+        path_params = dict(scope.get("path_params", ""))
+        for key, value in matched_params.items():
+            path_params[key] = self.param_convertors[key].convert(value)
+        return Match.FULL, {"path_params": path_params, "endpoint": self.app}
+
+    async def warmup(self) -> None:
+        app_warmup = getattr(self.app, "warmup", None)
+        if app_warmup is not None:
+            await app_warmup()
+
+    def url_path_for(self, name: str, /, **path_params: typing.Any) -> URLPath:
+        if self.name is not None and name == self.name and "path" in path_params:
+            path = path_params.pop("path")
+            if path_params.keys() != self.param_names:
+                raise NoMatchFound(name, path_params)
+            return URLPath(path=path, host=self.host_formatter(path_params))
+
+        if (self.name is None or name.startswith(self.name + ":")) and self.param_names <= path_params.keys():
+            remaining_name = name if self.name is None else name[len(self.name) + 1:]
+            host = self.host_formatter({key: path_params[key] for key in self.param_names})
+            remaining_params = {key: value for key, value in path_params.items() if key not in self.param_names}
+            for route in self.routes:
+                try:
+                    url = route.url_path_for(remaining_name, **remaining_params)
+                    return URLPath(path=str(url), protocol=url.protocol, host=host)
+                except NoMatchFound:
+                    pass
+        raise NoMatchFound(name, path_params)
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.app(scope, receive, send)
@@ -1,23 +1,42 @@
+import time
+import heapq
 import types
 import typing
 import inspect
+import logging
 import warnings
 import functools
+import traceback
 import contextlib
 from enum import Enum
 from contextlib import asynccontextmanager
 
+import anyio
+
 from starlette.type import ASGIApp, Scope, Receive, Send
-from starlette.utils import debug_print
-from starlette.route import BaseRoute
+from starlette.utils import is_async_callable
+from starlette.route import BaseRoute, Route, WebSocketRoute, NoMatchFound, get_hostname
+from starlette.radix import RadixTree
 from starlette.response import PlainTextResponse, RedirectResponse
 from starlette.exception import HTTPException
 from starlette.websocket import WebSocketClose
-from starlette.datastructure import URL
+from starlette.datastructure import URL, URLPath, LRUCache
 
 
 _T = typing.TypeVar("_T")
 
+logger = logging.getLogger(__name__)
+
+# 与 ExceptionMiddleware.http_exception 生成的响应相同，所有请求共用
+NOT_FOUND_RESPONSE = PlainTextResponse("Not Found", status_code=404).freeze()
+
+# 任意一个 Router 的 routes 变化时加一，依赖整棵路由树的缓存（例如 MetricsMiddleware）据此判断是否需要重建
+_routes_version = 0
+
+
+def routes_version() -> int:
+    return _routes_version
+
 
 class Match(Enum):
     NONE = 0
@@ -65,10 +84,37 @@ class _DefaultLifespan:
     async def __aexit__(self, *exc_info: object) -> None:
         await self._router.shutdown()
 
-    def __call__(self, _T, app: object) -> _T:
+    def __call__(self: _T, app: object) -> _T:
         return self
 
 
+class _RouteList(list):
+    """ Router.routes 使用的列表，发生任何修改时都会通知 Router 重建路由索引 """
+
+    def __init__(self, routes: typing.Iterable[BaseRoute], on_change: typing.Callable[[], None]) -> None:
+        super().__init__(routes)
+        self._on_change = on_change
+
+
+def _notify_change(name: str) -> typing.Callable:
+    method = getattr(list, name)
+
+    @functools.wraps(method)
+    def wrapper(self: _RouteList, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        result = method(self, *args, **kwargs)
+        self._on_change()
+        return result
+
+    return wrapper
+
+
+for _name in (
+        "__setitem__", "__delitem__", "__iadd__", "__imul__",
+        "append", "extend", "insert", "pop", "remove", "clear", "sort", "reverse",
+):
+    setattr(_RouteList, _name, _notify_change(_name))
+
+
 class Router:
 
     def __init__(
@@ -80,12 +126,30 @@ class Router:
             on_startup: typing.Optional[typing.Sequence[typing.Callable]] = None,
             on_shutdown: typing.Optional[typing.Sequence[typing.Callable]] = None,
             lifespan: typing.Optional[typing.Callable[[typing.Any], typing.AsyncContextManager]] = None,
+            # 路由解析结果缓存的条目数，None 表示不开启
+            cache_size: typing.Optional[int] = None,
+            # 在 lifespan.startup.complete 之前预热路由索引和静态响应
+            warmup: bool = False,
+            # on_startup 中的处理器互不依赖时可以开启，并发执行；默认按注册顺序依次执行
+            concurrent_startup: bool = False,
     ) -> None:
+        self._route_index: typing.Optional[RadixTree] = None
+        self._name_index: typing.Optional[typing.Dict[typing.Optional[str], typing.List[typing.Tuple[int, BaseRoute]]]] = None
+        self.cache: typing.Optional[LRUCache] = None if cache_size is None else LRUCache(cache_size)
         self.routes = [] if routes is None else list(routes)
         self.redirect_slashes = redirect_slashes
+        self.warmup_on_startup = warmup
+        self.concurrent_startup = concurrent_startup
         self.default = self.not_found if default is None else default
+        # 没有注册自定义处理器的错误状态码，运行在应用中时直接发送预先渲染好的响应而不是抛出 HTTPException
+        # 由 Starlette 根据 exception_handlers 设置
+        self.prerendered_statuses: typing.FrozenSet[int] = frozenset()
         self.on_startup = [] if on_startup is None else list(on_startup)
-        self.on_shutdown = [] if on_startup is None else list(on_shutdown)
+        self.on_shutdown = [] if on_shutdown is None else list(on_shutdown)
+        # 应用自身持有的资源（进程池、后台任务队列等）的启动和关闭
+        # 与 on_startup/on_shutdown 不同，无论使用哪种 lifespan 写法都会执行：在 lifespan 之前启动，之后关闭
+        self.resource_startup: typing.List[typing.Callable] = []
+        self.resource_shutdown: typing.List[typing.Callable] = []
 
         if lifespan is None:
             self.lifespan_context: typing.Callable[[typing.Any], typing.AsyncContextManager] = _DefaultLifespan(self)
@@ -98,22 +162,218 @@ class Router:
         else:
             self.lifespan_context = lifespan
 
+    @property
+    def routes(self) -> typing.List[BaseRoute]:
+        return self._routes
+
+    @routes.setter
+    def routes(self, routes: typing.Iterable[BaseRoute]) -> None:
+        self._routes = _RouteList(routes, self.routes_changed)
+        self.routes_changed()
+
+    def routes_changed(self) -> None:
+        """ routes 发生变化后调用，下一次请求时会重新构建路由索引 """
+        global _routes_version
+        _routes_version += 1
+        self._route_index = None
+        self._name_index = None
+        if self.cache is not None:
+            self.cache.clear()
+
+    @property
+    def route_index(self) -> RadixTree:
+        if self._route_index is None:
+            self._route_index = RadixTree(self._routes)
+        return self._route_index
+
+    @property
+    def name_index(self) -> typing.Dict[typing.Optional[str], typing.List[typing.Tuple[int, BaseRoute]]]:
+        """
+        name -> [(下标, route)]，用于反向路由。
+        只有 Route 和 WebSocketRoute 的名称是确定的，其他路由（例如 Mount 可能匹配 "name:child" 这样的名称）放在 None 下，每次都需要尝试。
+        """
+        if self._name_index is None:
+            name_index: typing.Dict[typing.Optional[str], typing.List[typing.Tuple[int, BaseRoute]]] = {None: []}
+            for index, route in enumerate(self._routes):
+                if type(route).url_path_for in (Route.url_path_for, WebSocketRoute.url_path_for):
+                    name_index.setdefault(route.name, []).append((index, route))
+                else:
+                    name_index[None].append((index, route))
+            self._name_index = name_index
+        return self._name_index
+
+    def url_path_for(self, name: str, /, **path_params: typing.Any) -> URLPath:
+        """ 反向路由：一次 dict 查找拿到同名的路由，而不是遍历所有路由 """
+        name_index = self.name_index
+        candidates = name_index.get(name, [])
+        if name_index[None]:
+            candidates = sorted(candidates + name_index[None], key=lambda item: item[0])
+
+        for _, route in candidates:
+            try:
+                return route.url_path_for(name, **path_params)
+            except NoMatchFound:
+                pass
+        raise NoMatchFound(name, path_params)
+
+    def iter_matches(
+            self,
+            scope: Scope,
+    ) -> typing.Iterator[typing.Tuple[BaseRoute, typing.Any, Scope, typing.Optional[typing.Dict[str, str]]]]:
+        """
+        按 routes 中的先后顺序产出所有匹配的 (route, match, child_scope, 未转换的参数)。
+        树中命中的路由已经拿到了参数，无需再跑整条 path 的正则；按主机名索引的 Host 命中时没有参数；
+        fallback 中的路由仍然调用 matches，参数为 None。
+        """
+        index = self.route_index
+        hits = index.lookup(scope["path"])
+        fallback = ((idx, route, None) for idx, route in index.fallback)
+        if index.hosts:
+            hosts = ((idx, route, {}) for idx, route in index.hosts.get(get_hostname(scope), ()))
+            candidates = heapq.merge(hits, hosts, fallback, key=lambda item: item[0])
+        else:
+            candidates = heapq.merge(hits, fallback, key=lambda item: item[0])
+
+        for _, route, params in candidates:
+            if params is None:
+                match, child_scope = route.matches(scope)
+            else:
+                match, child_scope = route.match_params(scope, params)
+            if match.value != Match.NONE.value:
+                yield route, match, child_scope, params
+
+    def resolve(self, scope: Scope) -> typing.Tuple[typing.Optional[BaseRoute], typing.Any, Scope]:
+        """
+        找出处理该请求的路由：第一个 FULL 匹配，否则第一个 PARTIAL 匹配。
+        开启缓存后，以 (scope type, method, path) 为键保存路由以及它在本层匹配到的原始参数，命中时不再执行任何正则；
+        存在按主机名索引的 Host 时，主机名也是键的一部分。
+        child_scope 依赖上层传入的 path_params 和 root_path（例如位于带参数的 Mount 中），
+        因此不缓存 child_scope，命中时用当前请求的 scope 调用 match_params 重新生成。
+        """
+        cache = self.cache
+        if cache is not None:
+            if self.route_index.hosts:
+                key = (scope["type"], scope.get("method"), scope["path"], get_hostname(scope))
+            else:
+                key = (scope["type"], scope.get("method"), scope["path"])
+            cached = cache.get(key)
+            if cached is not None:
+                route, params = cached
+                match, child_scope = route.match_params(scope, params)
+                return route, match, child_scope
+
+        partial = None
+        partial_scope: Scope = {}
+        partial_params = None
+
+        for route, match, child_scope, params in self.iter_matches(scope):
+            if match.value == Match.FULL.value:
+                break
+            elif match.value == Match.PARTIAL.value and partial is None:
+                partial = route
+                partial_scope = child_scope
+                partial_params = params
+        else:
+            route, match, child_scope, params = partial, Match.PARTIAL, partial_scope, partial_params
+
+        # 不在路由索引中的路由可能依赖 path 以外的信息进行匹配，此时不能缓存
+        if cache is not None and route is not None and not self.route_index.fallback:
+            cache.set(key, (route, params))
+        return route, match, child_scope
+
     async def not_found(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] == "websocket":
             websocket_close = WebSocketClose()
             await websocket_close(scope, receive, send)
             return
 
-        # 如果运行在一个 Starlette Application 内部，抛出一个异常，目的是内置的异常处理器能够处理并返回响应
-        # 如果是 plain ASGI apps，则只需要返回一个响应即可
-        if "app" in scope:
+        # 如果运行在一个 Starlette Application 内部并且注册了 404 处理器，抛出一个异常交给异常处理器
+        # 否则直接发送预先渲染好的响应，不需要经过异常的抛出和处理
+        # Mount 中的子 Router 使用最外层 Router 的设置
+        prerendered_statuses = getattr(scope.get("router"), "prerendered_statuses", self.prerendered_statuses)
+        if "app" in scope and 404 not in prerendered_statuses:
             raise HTTPException(status_code=404)
+        await NOT_FOUND_RESPONSE(scope, receive, send)
+
+    async def _run_hook(self, hook: typing.Callable, stage: str) -> None:
+        start = time.perf_counter()
+        if is_async_callable(hook):
+            await hook()
+        else:
+            hook()
+        logger.info("%s hook %s finished in %.1fms", stage, getattr(hook, "__qualname__", hook), (time.perf_counter() - start) * 1000)
+
+    async def startup(self) -> None:
+        """
+        默认按注册顺序依次执行 on_startup 中的处理器，后面的处理器可以依赖前面的（例如先连接数据库再预热缓存）。
+        开启 concurrent_startup 时并发执行，总耗时取决于最慢的那一个。
+        """
+        start = time.perf_counter()
+        if self.concurrent_startup:
+            async with anyio.create_task_group() as task_group:
+                for hook in self.on_startup:
+                    task_group.start_soon(self._run_hook, hook, "Startup")
         else:
-            response = PlainTextResponse("Not Found", status_code=404)
-        await response(scope, receive, send)
+            for hook in self.on_startup:
+                await self._run_hook(hook, "Startup")
+        logger.info("Startup finished in %.1fms", (time.perf_counter() - start) * 1000)
+
+    async def shutdown(self) -> None:
+        """ 关闭时按注册顺序依次执行 """
+        for hook in self.on_shutdown:
+            await self._run_hook(hook, "Shutdown")
+
+    async def warmup(self) -> None:
+        """
+        预热：构建路由索引和反向路由索引，解析每个没有参数的路由（开启缓存时会写入缓存），
+        并让路由提前渲染静态响应，避免部署后的第一批请求承担这些开销。
+        """
+        start = time.perf_counter()
+        index = self.route_index
+        name_index = self.name_index
+
+        for route in self._routes:
+            route_warmup = getattr(route, "warmup", None)
+            if route_warmup is not None:
+                await route_warmup()
+
+            if isinstance(route, Route) and not route.param_convertors:
+                for method in route.methods or ("GET",):
+                    self.resolve({"type": "http", "method": method, "path": route.path})
+
+        logger.info(
+            "Warm-up of %d routes (%d outside the index, %d names) finished in %.1fms",
+            len(self._routes), len(index.fallback), len(name_index) - 1, (time.perf_counter() - start) * 1000,
+        )
 
     async def lifespan(self, scope: Scope, receive: Receive, send: Send) -> None:
-        pass
+        """ 处理 ASGI lifespan 协议，启动完成（包括可选的预热）之后才发送 lifespan.startup.complete """
+        started = False
+        app = scope.get("app")
+        await receive()
+        try:
+            try:
+                for hook in self.resource_startup:
+                    await self._run_hook(hook, "Startup")
+                async with self.lifespan_context(app):
+                    if self.warmup_on_startup:
+                        await self.warmup()
+                    await send({"type": "lifespan.startup.complete"})
+                    started = True
+                    await receive()
+            finally:
+                # 启动失败时也要关闭已经启动的资源，关闭方法对没有启动的资源不做任何事
+                for hook in self.resource_shutdown:
+                    await self._run_hook(hook, "Shutdown")
+        except BaseException:
+            exc_text = traceback.format_exc()
+            if started:
+                await send({"type": "lifespan.shutdown.failed", "message": exc_text})
+            else:
+                await send({"type": "lifespan.startup.failed", "message": exc_text})
+            raise
+        else:
+            await send({"type": "lifespan.shutdown.complete"})
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         assert scope["type"] in ("http", "websocket", "lifespan")
@@ -125,23 +385,17 @@ class Router:
             await self.lifespan(scope, receive, send)
             return
 
-        # 局部的
-        partial = None
-
-        for route in self.routes:
-            match, child_scope = route.matches(scope)
-
-            if match.value == Match.FULL.value:
-                scope.update(child_scope)
-                await route.handle(scope, receive, send)
-                return
-            elif match.value == Match.PARTIAL.value and partial is None:
-                partial = route
-                partial_scope = child_scope
+        trace = scope.get("trace")
+        if trace is None:
+            route, match, child_scope = self.resolve(scope)
+        else:
+            start = time.perf_counter()
+            route, match, child_scope = self.resolve(scope)
+            trace.emit("route_resolved", route=route, match_time=time.perf_counter() - start)
 
-        if partial is not None:
-            scope.update(partial_scope)
-            await partial.handle(scope, receive, send)
+        if route is not None:
+            scope.update(child_scope)
+            await route.handle(scope, receive, send)
             return
 
         if scope["type"] == "http" and self.redirect_slashes and scope["path"] != "/":
@@ -151,9 +405,8 @@ class Router:
             else:
                 redirect_scope["path"] = redirect_scope["path"] + "/"
 
-            for route in self.routes:
-                match, child_scope = route.matches(redirect_scope)
-                if match != Match.NONE:
+            for route, match, child_scope, _ in self.iter_matches(redirect_scope):
+                if match.value != Match.NONE.value:
                     redirect_url = URL(scope=redirect_scope)
                     response = RedirectResponse(url=str(redirect_url))
                     await response(scope, receive, send)
@@ -0,0 +1,126 @@
+import json
+import typing
+import datetime
+import contextvars
+
+
+Encoder = typing.Callable[[typing.Any], typing.Any]
+Backend = typing.Callable[[typing.Any, Encoder], bytes]
+
+# 按 (模块名, 类名) 匹配的默认编码器，不需要在导入时加载对应的模块；
+# 第一次遇到这些类型的对象时才注册到 type_encoders 中
+LAZY_TYPE_ENCODERS: typing.Dict[typing.Tuple[str, str], Encoder] = {
+    ("uuid", "UUID"): str,
+}
+
+
+def stdlib_backend(content: typing.Any, default: Encoder) -> bytes:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=default,
+    ).encode("utf-8")
+
+
+def orjson_backend() -> Backend:
+    """ 需要安装 orjson，返回可以传给 JSONSerializer 的 backend """
+    try:
+        import orjson  # noqa: F401
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("The orjson backend requires the 'orjson' package to be installed.")
+    return _orjson_dumps
+
+
+def _orjson_dumps(content: typing.Any, default: Encoder) -> bytes:
+    # 定义在模块级别，序列化器可以被 pickle 传给进程池中的 endpoint
+    import orjson
+    return orjson.dumps(content, default=default)
+
+
+def estimate_size(content: typing.Any, limit: int) -> int:
+    """
+    粗略估计 content 编码后的字节数，超过 limit 立即返回。
+    开销与 min(payload, limit) 成正比，比真正编码一次便宜得多。
+    """
+    size = 0
+    stack = [content]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (str, bytes)):
+            size += len(obj) + 2
+        elif isinstance(obj, dict):
+            size += 2
+            for key, value in obj.items():
+                size += len(key) + 4 if isinstance(key, str) else 8
+                stack.append(value)
+        elif isinstance(obj, (list, tuple)):
+            size += 2 + len(obj)
+            stack.extend(obj)
+        else:
+            size += 8
+        if size > limit:
+            break
+    return size
+
+
+class JSONSerializer:
+    """
+    JSONResponse 使用的序列化器。
+    backend 负责真正的编码，默认是标准库 json；type_encoders 为 JSON 不支持的类型提供转换，UUID 和 dataclass 默认也可以编码。
+    估计大小超过 offload_threshold 的内容会在线程池中编码，避免阻塞事件循环，None 表示永远在事件循环中编码。
+    executor="process" 的 endpoint 会把序列化器 pickle 到子进程中，这时 backend 和 type_encoders 必须可以被 pickle。
+    """
+
+    def __init__(
+            self,
+            backend: Backend = stdlib_backend,
+            offload_threshold: typing.Optional[int] = 64 * 1024,
+    ) -> None:
+        self.backend = backend
+        self.offload_threshold = offload_threshold
+        self.type_encoders: typing.Dict[type, Encoder] = {
+            datetime.datetime: datetime.datetime.isoformat,
+            datetime.date: datetime.date.isoformat,
+            datetime.time: datetime.time.isoformat,
+        }
+
+    def register(self, cls: type, encoder: Encoder) -> None:
+        self.type_encoders[cls] = encoder
+
+    def default(self, obj: typing.Any) -> typing.Any:
+        mro = type(obj).__mro__
+        for cls in mro:
+            encoder = self.type_encoders.get(cls)
+            if encoder is not None:
+                return encoder(obj)
+        for cls in mro:
+            encoder = LAZY_TYPE_ENCODERS.get((cls.__module__, cls.__qualname__))
+            if encoder is not None:
+                self.register(cls, encoder)
+                return encoder(obj)
+        if hasattr(type(obj), "__dataclass_fields__"):
+            import dataclasses
+            return dataclasses.asdict(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumps(self, content: typing.Any) -> bytes:
+        return self.backend(content, self.default)
+
+    def should_offload(self, content: typing.Any) -> bool:
+        threshold = self.offload_threshold
+        return threshold is not None and estimate_size(content, threshold) > threshold
+
+
+default_serializer = JSONSerializer()
+
+# 由 Starlette.__call__ 设置为当前应用的序列化器，JSONResponse 在创建时读取
+serializer_context: contextvars.ContextVar[JSONSerializer] = contextvars.ContextVar(
+    "serializer_context", default=default_serializer,
+)
+
+
+def get_serializer() -> JSONSerializer:
+    return serializer_context.get()
@@ -0,0 +1,125 @@
+import os
+import stat
+import time
+import typing
+
+from starlette.type import Scope, Receive, Send
+from starlette.response import Response, FileResponse, PlainTextResponse, file_etag
+from starlette.exception import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructure import Headers, LRUCache
+
+
+class NotModifiedResponse(Response):
+    """ 304 响应，只保留与缓存相关的头部 """
+    NOT_MODIFIED_HEADERS = (
+        "cache-control",
+        "content-location",
+        "date",
+        "etag",
+        "expires",
+        "vary",
+    )
+
+    def __init__(self, headers: typing.Mapping[str, str]) -> None:
+        super().__init__(
+            status_code=304,
+            headers={
+                name: headers[name] for name in self.NOT_MODIFIED_HEADERS if name in headers
+            },
+        )
+
+
+class StaticFiles:
+    """
+    提供目录下静态文件的 ASGI application。
+    os.stat 的结果和 ETag 保存在有界的 LRU 缓存中，cache_ttl 秒内的热点文件不会再访问文件系统。
+    """
+
+    def __init__(
+            self,
+            *,
+            directory: typing.Union[str, "os.PathLike[str]"],
+            html: bool = False,
+            check_dir: bool = True,
+            cache_size: int = 1024,
+            cache_ttl: float = 2.0,
+    ) -> None:
+        self.directory = os.path.realpath(directory)
+        self.html = html
+        self.cache_ttl = cache_ttl
+        self.cache: LRUCache = LRUCache(cache_size)
+        if check_dir and not os.path.isdir(self.directory):
+            raise RuntimeError(f"Directory '{directory}' does not exist")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+
+        if scope["method"] not in ("GET", "HEAD"):
+            if "app" in scope:
+                raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+            response: Response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+            await response(scope, receive, send)
+            return
+
+        response = await self.get_response(scope["path"], scope)
+        await response(scope, receive, send)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        found = await self.lookup_path(path)
+        if found is None and self.html:
+            found = await self.lookup_path("404.html")
+            if found is not None:
+                full_path, stat_result, _ = found
+                return FileResponse(full_path, status_code=404, stat_result=stat_result, method=scope["method"])
+
+        if found is None:
+            if "app" in scope:
+                raise HTTPException(status_code=404)
+            return PlainTextResponse("Not Found", status_code=404)
+
+        full_path, stat_result, etag = found
+        response = FileResponse(full_path, stat_result=stat_result, method=scope["method"])
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            if etag in tags or "*" in tags:
+                return NotModifiedResponse(response.headers)
+        return response
+
+    async def lookup_path(self, path: str) -> typing.Optional[typing.Tuple[str, os.stat_result, str]]:
+        """ 返回 (完整路径, stat 结果, ETag)，优先从缓存中获取 """
+        now = time.monotonic()
+        cached = self.cache.get(path)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        found = await run_in_threadpool(self._lookup_path, path)
+        if found is not None:
+            self.cache.set(path, (now + self.cache_ttl, found))
+        return found
+
+    def _lookup_path(self, path: str) -> typing.Optional[typing.Tuple[str, os.stat_result, str]]:
+        relative_path = os.path.normpath(os.path.join(*path.split("/"))) if path.strip("/") else "."
+        full_path = os.path.realpath(os.path.join(self.directory, relative_path))
+
+        # 不允许通过 ".." 或软链接访问目录以外的文件
+        if os.path.commonpath([full_path, self.directory]) != self.directory:
+            return None
+
+        try:
+            stat_result = os.stat(full_path)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return None
+
+        if stat.S_ISDIR(stat_result.st_mode) and self.html:
+            full_path = os.path.join(full_path, "index.html")
+            try:
+                stat_result = os.stat(full_path)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                return None
+
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return full_path, stat_result, file_etag(stat_result)
@@ -0,0 +1,150 @@
+"""
+请求生命周期的 tracing hook。
+
+没有任何订阅者时 Starlette 不会创建 RequestTrace，scope 中也没有 "trace"，
+Router 和 endpoint 只多一次 scope.get，不会计时也不会包装 send。
+
+hook 是同步函数，签名为 hook(trace: RequestTrace, **info)，各事件传入的 info：
+
+    request_start   无
+    route_resolved  route（没有匹配时为 None），match_time（匹配耗时，秒）
+    handler_start   endpoint
+    handler_end     endpoint，duration（秒），exc（没有异常时为 None）
+    response_start  status_code，headers（原始头部列表）
+    response_end    status_code，response_size（body 字节数），duration（从 request_start 开始，秒）
+"""
+import os
+import re
+import time
+import typing
+import logging
+
+from starlette.type import Scope, Send, Message
+
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ("request_start", "route_resolved", "handler_start", "handler_end", "response_start", "response_end")
+
+# W3C Trace Context：version-trace_id-parent_id-trace_flags
+TRACEPARENT_REGEX = re.compile(r"([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+INVALID_TRACE_ID = "0" * 32
+INVALID_SPAN_ID = "0" * 16
+
+Hook = typing.Callable[..., None]
+
+
+def parse_traceparent(value: str) -> typing.Optional[typing.Tuple[str, str, str]]:
+    """ 返回 (trace_id, parent_id, trace_flags)，格式不合法时返回 None """
+    value = value.strip()
+    match = TRACEPARENT_REGEX.match(value)
+    if match is None:
+        return None
+
+    version, trace_id, parent_id, flags = match.groups()
+    if version == "ff" or trace_id == INVALID_TRACE_ID or parent_id == INVALID_SPAN_ID:
+        return None
+    # 00 版本长度固定；更高的版本允许在后面追加字段
+    if len(value) != 55 and (version == "00" or value[55] != "-"):
+        return None
+    return trace_id, parent_id, flags
+
+
+class RequestTrace:
+    """ 一次请求的 tracing 状态，放在 scope["trace"] 中，hook 可以在 attributes 中保存自己的数据 """
+
+    __slots__ = (
+        "tracer", "scope", "trace_id", "parent_id", "span_id", "trace_flags", "tracestate",
+        "start_time", "status_code", "response_size", "attributes",
+    )
+
+    def __init__(self, tracer: "Tracer", scope: Scope) -> None:
+        self.tracer = tracer
+        self.scope = scope
+        self.trace_id = self.parent_id = None
+        self.trace_flags = "00"
+        self.tracestate: typing.Optional[str] = None
+
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                parsed = parse_traceparent(value.decode("latin-1"))
+                if parsed is not None:
+                    self.trace_id, self.parent_id, self.trace_flags = parsed
+            elif key == b"tracestate":
+                self.tracestate = value.decode("latin-1")
+
+        if self.trace_id is None:
+            self.trace_id = os.urandom(16).hex()
+            # 没有上游的 traceparent 时，tracestate 也没有意义
+            self.tracestate = None
+        self.span_id = os.urandom(8).hex()
+
+        self.start_time = time.perf_counter()
+        self.status_code: typing.Optional[int] = None
+        self.response_size = 0
+        self.attributes: typing.Dict[str, typing.Any] = {}
+
+    @property
+    def traceparent(self) -> str:
+        """ 当前请求这个 span 的 traceparent，调用下游服务时放进请求头 """
+        return f"00-{self.trace_id}-{self.span_id}-{self.trace_flags}"
+
+    @property
+    def sampled(self) -> bool:
+        return bool(int(self.trace_flags, 16) & 0x01)
+
+    def emit(self, event: str, **info: typing.Any) -> None:
+        for hook in self.tracer.hooks[event]:
+            # hook 出错不能影响请求本身
+            try:
+                hook(self, **info)
+            except Exception:
+                logger.exception("Trace hook %r failed on %s", hook, event)
+
+    def wrap_send(self, send: Send) -> Send:
+        async def traced_send(message: Message) -> None:
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                self.status_code = message["status"]
+                self.emit("response_start", status_code=self.status_code, headers=message.get("headers", []))
+                await send(message)
+                return
+
+            await send(message)
+            if message_type == "http.response.body":
+                self.response_size += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    self.emit(
+                        "response_end",
+                        status_code=self.status_code,
+                        response_size=self.response_size,
+                        duration=time.perf_counter() - self.start_time,
+                    )
+
+        return traced_send
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(traceparent={self.traceparent!r})"
+
+
+class Tracer:
+    """ 应用的 hook 注册表，active 为 False 时请求不会进入任何 tracing 逻辑 """
+
+    def __init__(self) -> None:
+        self.hooks: typing.Dict[str, typing.List[Hook]] = {event: [] for event in EVENTS}
+        self.active = False
+
+    def subscribe(self, event: str, hook: Hook) -> None:
+        assert event in self.hooks, f"Unknown trace event '{event}', expected one of {', '.join(EVENTS)}"
+        self.hooks[event].append(hook)
+        self.active = True
+
+    def unsubscribe(self, event: str, hook: Hook) -> None:
+        self.hooks[event].remove(hook)
+        self.active = any(self.hooks.values())
+
+    def start(self, scope: Scope) -> RequestTrace:
+        trace = RequestTrace(self, scope)
+        scope["trace"] = trace
+        trace.emit("request_start")
+        return trace
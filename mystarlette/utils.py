@@ -1,7 +1,16 @@
+import sys
 import typing
 import pprint
 import asyncio
 import functools
+import contextlib
+
+if sys.version_info < (3, 11):  # pragma: no cover
+    try:
+        from exceptiongroup import BaseExceptionGroup
+    except ImportError:
+        # anyio 3 的 task group 不会产生 ExceptionGroup
+        BaseExceptionGroup = ()
 
 
 def is_async_callable(obj: typing.Any) -> bool:
@@ -16,6 +25,17 @@ def is_async_callable(obj: typing.Any) -> bool:
         (callable(obj) and asyncio.iscoroutinefunction(obj.__call__))
 
 
+@contextlib.contextmanager
+def collapse_excgroups() -> typing.Iterator[None]:
+    """ task group 只包装了一个异常时，抛出原来的异常，让调用方可以按异常类型处理 """
+    try:
+        yield
+    except BaseExceptionGroup as exc:
+        while isinstance(exc, BaseExceptionGroup) and len(exc.exceptions) == 1:
+            exc = exc.exceptions[0]
+        raise exc
+
+
 def debug_print(name: str = "", obj: typing.Any = None) -> None:
     print("-" * 50)
     print(name)
@@ -1,6 +1,352 @@
+import enum
+import json
 import typing
 
-from starlette.type import Scope, Receive, Send
+import anyio
+from anyio.abc import TaskGroup
+
+from starlette.type import Scope, Receive, Send, Message
+from starlette.request import HTTPConnection
+from starlette.serializer import get_serializer
+
+
+class WebSocketState(enum.Enum):
+    CONNECTING = 0
+    CONNECTED = 1
+    DISCONNECTED = 2
+
+
+class WebSocketDisconnect(Exception):
+
+    def __init__(self, code: int = 1000, reason: typing.Optional[str] = None) -> None:
+        self.code = code
+        self.reason = reason or ""
+
+    def __repr__(self) -> str:
+        class_name = self.__class__.__name__
+        return f"{class_name}(code={self.code!r}, reason={self.reason!r})"
+
+
+# 发送队列满时的处理方式
+# block：等待队列有空位，对生产者形成背压 | drop：丢弃这条消息 | close：以 1008 关闭连接
+OVERFLOW_POLICIES = ("block", "drop", "close")
+
+
+class WebSocket(HTTPConnection):
+    """
+    WebSocket 连接。
+    send_* 只是把消息放进有界的发送队列（anyio memory object stream），由 writer 任务发送：
+    同一轮事件循环中排队的消息会在 writer 的一次唤醒中连续发送；设置了 batch_delimiter 时，
+    相邻的小文本消息会用分隔符合并成一帧（会改变消息边界，需要客户端按分隔符拆分）。
+    writer 由 start_writer 在连接的 task group 中启动（websocket_session 会自动启动），
+    没有 writer 时 send_* 直接发送，offer 总是返回 False。
+    接收到的消息超过 max_message_size 字节时以 1009 关闭连接。
+    """
+
+    def __init__(
+            self,
+            scope: Scope,
+            receive: Receive,
+            send: Send,
+            max_queue_size: int = 64,
+            overflow: str = "block",
+            batch_delimiter: typing.Optional[str] = None,
+            max_batch_size: int = 64 * 1024,
+            max_message_size: typing.Optional[int] = None,
+    ) -> None:
+        super().__init__(scope)
+        assert scope["type"] == "websocket"
+        assert overflow in OVERFLOW_POLICIES, f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}"
+        self._receive = receive
+        self._send = send
+        self.client_state = WebSocketState.CONNECTING
+        self.application_state = WebSocketState.CONNECTING
+
+        self.overflow = overflow
+        self.batch_delimiter = batch_delimiter
+        self.max_batch_size = max_batch_size
+        self.max_message_size = max_message_size
+        self.max_queue_size = max_queue_size
+        # overflow 为 block 时，生产者在 send 上等待 writer 腾出空位；连接不可用时关闭接收端唤醒它们
+        self._queue_send, self._queue_receive = anyio.create_memory_object_stream(max_queue_size)
+        self._task_group: typing.Optional[TaskGroup] = None
+        self._writer_scope: typing.Optional[anyio.CancelScope] = None
+        self._writer_done: typing.Optional[anyio.Event] = None
+        # 已经放进队列但还没有发送的消息数量，降为 0 时唤醒 flush
+        self._unsent = 0
+        self._idle: typing.Optional[anyio.Event] = None
+        # writer 发送失败（通常是客户端已经断开）时的异常，之后的 send_* 会直接抛出
+        self._send_error: typing.Optional[BaseException] = None
+        # 已发送的帧 | writer 的唤醒次数 | 因队列满或连接断开而丢弃的消息
+        self.frames_sent = 0
+        self.batches_sent = 0
+        self.dropped = 0
+
+    # HTTPConnection 是按 scope 内容比较的 Mapping，连接本身按身份比较，这样可以放进集合和字典
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    # 接收
+
+    async def receive(self) -> Message:
+        if self.client_state == WebSocketState.CONNECTING:
+            message = await self._receive()
+            assert message["type"] == "websocket.connect"
+            self.client_state = WebSocketState.CONNECTED
+            return message
+
+        if self.client_state == WebSocketState.CONNECTED:
+            message = await self._receive()
+            if message["type"] == "websocket.disconnect":
+                self.client_state = WebSocketState.DISCONNECTED
+            return message
+
+        raise RuntimeError('Cannot call "receive" once a disconnect message has been received.')
+
+    async def _receive_data(self) -> Message:
+        if self.application_state != WebSocketState.CONNECTED:
+            raise RuntimeError('WebSocket is not connected. Need to call "accept" first.')
+        message = await self.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+
+        if self.max_message_size is not None:
+            # 按字节计算，文本消息使用 UTF-8 编码后的长度，纯 ASCII 文本不需要真正编码
+            text = message.get("text")
+            if text is not None:
+                size = len(text) if text.isascii() else len(text.encode("utf-8"))
+            else:
+                size = len(message.get("bytes") or b"")
+            if size > self.max_message_size:
+                await self.close(code=1009, reason="Message too big", discard=True)
+                raise WebSocketDisconnect(1009, "Message too big")
+        return message
+
+    async def receive_text(self) -> str:
+        message = await self._receive_data()
+        return message["text"]
+
+    async def receive_bytes(self) -> bytes:
+        message = await self._receive_data()
+        return message["bytes"]
+
+    async def receive_json(self, mode: str = "text") -> typing.Any:
+        assert mode in ("text", "binary")
+        message = await self._receive_data()
+        if mode == "text":
+            return json.loads(message["text"])
+        return json.loads(message["bytes"].decode("utf-8"))
+
+    async def __aiter__(self) -> typing.AsyncIterator[typing.Union[str, bytes]]:
+        """ 依次产出收到的文本或二进制消息，客户端断开时结束 """
+        try:
+            while True:
+                message = await self._receive_data()
+                text = message.get("text")
+                yield text if text is not None else message["bytes"]
+        except WebSocketDisconnect:
+            pass
+
+    # 发送
+
+    async def accept(
+            self,
+            subprotocol: typing.Optional[str] = None,
+            headers: typing.Optional[typing.Iterable[typing.Tuple[bytes, bytes]]] = None,
+    ) -> None:
+        if self.client_state == WebSocketState.CONNECTING:
+            # 还没有收到 websocket.connect
+            await self.receive()
+        await self._send({"type": "websocket.accept", "subprotocol": subprotocol, "headers": list(headers or [])})
+        self.application_state = WebSocketState.CONNECTED
+
+    async def send(self, message: Message) -> None:
+        """ 数据帧经过发送队列，accept 和 close 直接发送 """
+        if message["type"] == "websocket.send":
+            await self._enqueue(message)
+        elif message["type"] == "websocket.close":
+            await self.close(message.get("code", 1000), message.get("reason"))
+        else:
+            await self._send(message)
+
+    async def send_text(self, data: str) -> None:
+        await self._enqueue({"type": "websocket.send", "text": data})
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self._enqueue({"type": "websocket.send", "bytes": data})
+
+    async def send_json(self, data: typing.Any, mode: str = "text") -> None:
+        assert mode in ("text", "binary")
+        encoded = get_serializer().dumps(data)
+        if mode == "text":
+            await self.send_text(encoded.decode("utf-8"))
+        else:
+            await self.send_bytes(encoded)
+
+    async def _enqueue(self, message: Message) -> None:
+        if self._send_error is not None:
+            raise WebSocketDisconnect(1006, "Connection lost") from self._send_error
+        if self.application_state != WebSocketState.CONNECTED:
+            raise RuntimeError('Cannot send data: the WebSocket is not accepted or already closed.')
+        if self._writer_scope is None:
+            await self._send(message)
+            self.frames_sent += 1
+            return
+
+        # 先计数再入队：阻塞的 send 返回之前 writer 可能已经把消息取走并发送
+        self._unsent += 1
+        try:
+            self._queue_send.send_nowait(message)
+        except anyio.WouldBlock:
+            if self.overflow == "block":
+                try:
+                    await self._queue_send.send(message)
+                    return
+                except (anyio.BrokenResourceError, anyio.ClosedResourceError):
+                    self._unsent -= 1
+                    raise WebSocketDisconnect(1006, "Connection lost") from self._send_error
+            self._unsent -= 1
+            if self.overflow == "drop":
+                self.dropped += 1
+                return
+            # 客户端跟不上，丢弃积压的消息并关闭连接，通知生产者停止
+            await self.close(code=1008, reason="Outgoing queue full", discard=True)
+            raise WebSocketDisconnect(1008, "Outgoing queue full")
+        except (anyio.BrokenResourceError, anyio.ClosedResourceError):
+            self._unsent -= 1
+            raise WebSocketDisconnect(1006, "Connection lost") from self._send_error
+
+    def offer(self, message: Message) -> bool:
+        """
+        不等待地把一个已经编码好的 websocket.send 消息放进发送队列，队列已满或连接不可用时返回 False。
+        Broadcast 用它把同一个消息对象分发给所有订阅者。
+        """
+        if self._send_error is not None or self.application_state != WebSocketState.CONNECTED:
+            return False
+        if self._writer_scope is None:
+            return False
+        try:
+            self._queue_send.send_nowait(message)
+        except (anyio.WouldBlock, anyio.BrokenResourceError, anyio.ClosedResourceError):
+            return False
+        self._unsent += 1
+        return True
+
+    def start_writer(self, task_group: TaskGroup) -> None:
+        """ 在 task_group 中启动 writer，连接结束时需要调用 abort（或 close）让它退出 """
+        if self._writer_scope is None:
+            self._task_group = task_group
+            self._writer_scope = anyio.CancelScope()
+            self._writer_done = anyio.Event()
+            task_group.start_soon(self._write)
+
+    async def _write(self) -> None:
+        queue = self._queue_receive
+        try:
+            with self._writer_scope:
+                while True:
+                    # 队列中已经有消息时不经过 receive 的 checkpoint，直接取走
+                    try:
+                        message = queue.receive_nowait()
+                    except anyio.WouldBlock:
+                        message = await queue.receive()
+                    # writer 在下一轮事件循环中才被唤醒，这一轮中排队的消息会被一起发送
+                    batch = [message]
+                    while True:
+                        try:
+                            batch.append(queue.receive_nowait())
+                        except anyio.WouldBlock:
+                            break
+                    self.batches_sent += 1
+                    for frame in self._coalesce(batch):
+                        await self._send(frame)
+                        self.frames_sent += 1
+                    self._unsent -= len(batch)
+                    if self._unsent <= 0 and self._idle is not None:
+                        self._idle.set()
+        except Exception as exc:
+            self._send_error = exc
+            self._discard_queue()
+        finally:
+            self._writer_done.set()
+            if self._idle is not None:
+                self._idle.set()
+
+    def _coalesce(self, batch: typing.List[Message]) -> typing.List[Message]:
+        delimiter = self.batch_delimiter
+        if delimiter is None or len(batch) == 1:
+            return batch
+
+        frames: typing.List[Message] = []
+        texts: typing.List[str] = []
+        size = 0
+        for message in batch:
+            text = message.get("text")
+            if text is not None and size + len(text) <= self.max_batch_size:
+                texts.append(text)
+                size += len(text) + len(delimiter)
+                continue
+            if texts:
+                frames.append({"type": "websocket.send", "text": delimiter.join(texts)})
+                texts, size = [], 0
+            if text is not None:
+                texts.append(text)
+                size = len(text) + len(delimiter)
+            else:
+                frames.append(message)
+        if texts:
+            frames.append({"type": "websocket.send", "text": delimiter.join(texts)})
+        return frames
+
+    def _discard_queue(self) -> None:
+        queue = self._queue_receive
+        while True:
+            try:
+                queue.receive_nowait()
+            except (anyio.WouldBlock, anyio.EndOfStream, anyio.ClosedResourceError):
+                break
+            self.dropped += 1
+        # 关闭接收端，等待空位的生产者会收到 BrokenResourceError，看到连接已经不可用
+        queue.close()
+        if self._idle is not None:
+            self._idle.set()
+
+    async def flush(self) -> None:
+        """ 等待发送队列中的消息全部发送完，writer 已经退出时直接返回 """
+        if self._writer_scope is None:
+            return
+        while self._unsent > 0 and self._send_error is None and not self._writer_done.is_set():
+            self._idle = anyio.Event()
+            await self._idle.wait()
+
+    async def abort(self) -> None:
+        """ 丢弃发送队列中的消息并停止 writer，不发送 close """
+        self._discard_queue()
+        if self._writer_scope is not None:
+            self._writer_scope.cancel()
+            await self._writer_done.wait()
+
+    async def close(self, code: int = 1000, reason: typing.Optional[str] = None, discard: bool = False) -> None:
+        """ 默认先发送完队列中的消息；discard 为 True 时丢弃积压的消息并中断正在进行的发送。writer 随后退出 """
+        if self.application_state == WebSocketState.DISCONNECTED:
+            return
+        self.application_state = WebSocketState.DISCONNECTED
+
+        if not discard:
+            await self.flush()
+        await self.abort()
+
+        if self._send_error is None:
+            await self._send({"type": "websocket.close", "code": code, "reason": reason or ""})
+
+    def close_soon(self, code: int = 1000, reason: typing.Optional[str] = None) -> None:
+        """
+        不等待地在连接的 task group 中丢弃积压的消息并关闭连接，供不能 await 的调用方（如 Broadcast）使用。
+        writer 已经退出（连接正在结束）或者没有启动时什么都不做。
+        """
+        if self._writer_scope is None or self._writer_done.is_set():
+            return
+        self._task_group.start_soon(self.close, code, reason, True)
 
 
 class WebSocketClose:
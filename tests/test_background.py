@@ -0,0 +1,55 @@
+import anyio
+import pytest
+
+from starlette.background import BackgroundExecutor
+
+
+@pytest.mark.parametrize("backend", ["asyncio", "trio"])
+def test_executor_drains_queue_on_shutdown(backend):
+    executor = BackgroundExecutor(max_queue_size=10, workers=2)
+    done = []
+
+    async def task():
+        await anyio.sleep(0.01)
+        done.append(1)
+
+    async def main():
+        await executor.startup()
+        for _ in range(5):
+            await executor.submit(task)
+        assert executor.queue_depth > 0
+        await executor.shutdown()
+
+    anyio.run(main, backend=backend)
+    assert done == [1] * 5
+    assert executor.statistics()["completed"] == 5
+    assert not executor.started
+
+
+def test_executor_cancels_remaining_tasks_after_drain_timeout():
+    executor = BackgroundExecutor(max_queue_size=10, workers=1, drain_timeout=0.05)
+
+    async def forever():
+        await anyio.sleep_forever()
+
+    async def main():
+        await executor.startup()
+        for _ in range(3):
+            await executor.submit(forever)
+        await executor.shutdown()
+
+    anyio.run(main)
+    # 一个正在执行的任务被取消，另外两个还在队列中
+    assert executor.dropped == 2
+
+
+def test_executor_runs_tasks_inline_when_not_started():
+    executor = BackgroundExecutor()
+    done = []
+
+    async def task():
+        done.append(1)
+
+    anyio.run(executor.submit, task)
+    assert done == [1]
+    assert not executor.started
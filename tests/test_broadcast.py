@@ -0,0 +1,47 @@
+import anyio
+
+from starlette.websocket import WebSocket, WebSocketState
+from starlette.broadcast import Broadcast
+
+
+def make_socket(task_group, messages, delay=0.0):
+    async def receive():
+        await anyio.sleep_forever()
+
+    async def send(message):
+        if delay and message["type"] == "websocket.send":
+            await anyio.sleep(delay)
+        messages.append(message)
+
+    websocket = WebSocket({"type": "websocket", "path": "/", "headers": []}, receive, send, max_queue_size=2)
+    websocket.client_state = websocket.application_state = WebSocketState.CONNECTED
+    websocket.start_writer(task_group)
+    return websocket
+
+
+def test_lagging_subscriber_is_closed_in_its_task_group():
+    hub = Broadcast()
+    fast, slow = [], []
+
+    async def main():
+        with anyio.fail_after(5):
+            await run()
+
+    async def run():
+        async with anyio.create_task_group() as task_group:
+            sockets = [make_socket(task_group, fast), make_socket(task_group, slow, delay=10)]
+            for websocket in sockets:
+                hub.subscribe("room", websocket)
+            for index in range(4):
+                hub.publish("room", str(index))
+                await anyio.sleep(0.01)
+            for websocket in sockets:
+                await websocket.close()
+
+    anyio.run(main)
+
+    assert hub.evicted == 1
+    assert [message.get("text") for message in fast] == ["0", "1", "2", "3", None]
+    # 慢的连接正在发送的消息被中断，积压的消息被丢弃，然后以 1008 关闭
+    assert slow == [{"type": "websocket.close", "code": 1008, "reason": "Subscriber lagging"}]
+    assert "room" in hub.channels and len(hub.channels["room"]) == 1
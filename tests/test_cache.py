@@ -0,0 +1,21 @@
+import pytest
+
+from starlette.middleware.cache import etag_matches
+
+
+@pytest.mark.parametrize(
+    "if_none_match, etag, expected",
+    [
+        (b'"abc"', b'"abc"', True),
+        (b'W/"abc"', b'"abc"', True),
+        (b'"abc"', b'W/"abc"', True),
+        (b'W/"abc"', b'W/"abc"', True),
+        (b'"xyz", W/"abc"', b'"abc"', True),
+        (b'"xyz"', b'W/"abc"', False),
+        (b'W/"xyz"', b'"abc"', False),
+        (b"*", b'"abc"', True),
+        (b"*", b'W/"abc"', True),
+    ],
+)
+def test_etag_matches_uses_weak_comparison(if_none_match, etag, expected):
+    assert etag_matches(if_none_match, etag) is expected
@@ -0,0 +1,36 @@
+import threading
+
+import anyio
+import pytest
+
+from starlette.concurrency import ProcessExecutor
+
+
+def identity(value):
+    return value
+
+
+def fail(value):
+    raise TypeError("bad value")
+
+
+def test_process_executor_reports_unpicklable_arguments():
+    executor = ProcessExecutor(max_workers=1)
+
+    def local():
+        pass
+
+    async def main():
+        try:
+            assert await executor.run(identity, 1) == 1
+            # 局部函数 pickle 时抛出 AttributeError，锁抛出 TypeError，lambda 抛出 PicklingError
+            for argument in (local, threading.Lock(), lambda: None):
+                with pytest.raises(TypeError, match="cannot be sent to the process pool"):
+                    await executor.run(identity, argument)
+            # 函数自己抛出的 TypeError 不会被改写
+            with pytest.raises(TypeError, match="bad value"):
+                await executor.run(fail, 1)
+        finally:
+            await executor.shutdown()
+
+    anyio.run(main)
@@ -0,0 +1,56 @@
+import anyio
+import pytest
+
+from starlette.route import Route
+from starlette.response import PlainTextResponse
+from starlette.middleware import Middleware
+from starlette.application import Starlette
+
+
+class PassThroughMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+
+class BrokenStream:
+    """ 发送了 http.response.start 和一部分响应体之后抛出异常 """
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"first", "more_body": True})
+        raise RuntimeError("mid-stream")
+
+
+@pytest.mark.parametrize("middleware", [[], [Middleware(PassThroughMiddleware)]])
+def test_error_handler_is_called_after_response_started(middleware):
+    """ 异常发生在 http.response.start 之后时仍然调用 500 处理器，但不再发送它的响应 """
+    handled = []
+
+    async def error_handler(request, exc):
+        handled.append(str(exc))
+        return PlainTextResponse("handled", status_code=500)
+
+    app = Starlette(
+        routes=[Route("/", BrokenStream())],
+        middleware=middleware,
+        exception_handlers={500: error_handler},
+    )
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "root_path": "", "headers": [], "query_string": b""}
+    with pytest.raises(RuntimeError):
+        anyio.run(app, scope, receive, send)
+
+    assert handled == ["mid-stream"]
+    assert [message.get("status") for message in messages if message["type"] == "http.response.start"] == [200]
+    assert b"handled" not in b"".join(message.get("body", b"") for message in messages)
@@ -0,0 +1,73 @@
+import anyio
+
+from starlette.route import Route, Mount
+from starlette.router import Router
+from starlette.response import PlainTextResponse
+from starlette.middleware.metrics import MetricsMiddleware, UNMATCHED_ROUTE
+
+
+async def shared(request):
+    return PlainTextResponse("shared")
+
+
+class PlainApp:
+    """ 没有 routes 的普通 ASGI app，相当于 StaticFiles """
+
+    async def __call__(self, scope, receive, send):
+        await PlainTextResponse("plain")(scope, receive, send)
+
+
+async def get(app, path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "root_path": "", "headers": [], "query_string": b""}
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+def recorded(middleware):
+    return {route for _, route in middleware.registry.routes}
+
+
+def test_shared_endpoint_is_attributed_to_each_route():
+    router = Router([Route("/a/{id:int}", shared), Mount("/b", routes=[Route("/{name}", shared)])])
+    middleware = MetricsMiddleware(router)
+
+    async def main():
+        for path in ("/a/1", "/b/x", "/a/2"):
+            assert await get(middleware, path) == 200
+
+    anyio.run(main)
+    assert recorded(middleware) == {"/a/{id:int}", "/b/{name}"}
+
+
+def test_templates_are_rebuilt_after_routes_change():
+    router = Router([Route("/a", shared)])
+    middleware = MetricsMiddleware(router)
+
+    async def main():
+        assert await get(middleware, "/a") == 200
+        router.routes.append(Route("/c", shared))
+        assert await get(middleware, "/c") == 200
+        assert await get(middleware, "/a") == 200
+
+    anyio.run(main)
+    assert recorded(middleware) == {"/a", "/c"}
+
+
+def test_mounted_asgi_app_uses_mount_template():
+    router = Router([Mount("/static", app=PlainApp())])
+    middleware = MetricsMiddleware(router)
+
+    async def main():
+        assert await get(middleware, "/static/css/site.css") == 200
+        assert await get(middleware, "/missing") == 404
+
+    anyio.run(main)
+    assert recorded(middleware) == {"/static/{path:path}", UNMATCHED_ROUTE}
@@ -0,0 +1,74 @@
+import anyio
+
+from starlette.route import Route
+from starlette.router import Router
+from starlette.response import PlainTextResponse
+from starlette.middleware import Middleware
+from starlette.application import Starlette
+from starlette.datastructure import MutableHeaders
+
+
+class ServedByMiddleware:
+    """ 在每个响应上添加一个头部，与常见的修改 headers 的中间件相同 """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        async def sender(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["x-served-by"] = "test"
+            await send(message)
+
+        await self.app(scope, receive, sender)
+
+
+async def call(app, path="/", method="GET"):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "root_path": "", "headers": [], "query_string": b""}
+    await app(scope, receive, send)
+    return messages
+
+
+def test_frozen_response_headers_can_be_mutated_by_middleware():
+    frozen = PlainTextResponse("hello").freeze()
+    app = ServedByMiddleware(frozen)
+
+    async def main():
+        for _ in range(2):
+            start, body = await call(app)
+            assert start["status"] == 200
+            assert dict(start["headers"])[b"x-served-by"] == b"test"
+            assert body["body"] == b"hello"
+        # 共享的头部没有被修改
+        assert b"x-served-by" not in dict(frozen.raw_headers)
+
+    anyio.run(main)
+
+
+def test_not_found_and_method_not_allowed_through_header_middleware():
+    """ 404 和 405 使用预先渲染好的响应，经过修改 headers 的中间件时同样正常 """
+    async def homepage(request):
+        return PlainTextResponse("home")
+
+    routes = [Route("/", homepage, methods=["GET"])]
+    apps = [
+        ServedByMiddleware(Router(routes)),
+        Starlette(routes=routes, middleware=[Middleware(ServedByMiddleware)]),
+    ]
+
+    async def main():
+        for app in apps:
+            for path, method, status in (("/missing", "GET", 404), ("/", "POST", 405)):
+                start, _ = await call(app, path, method)
+                assert start["status"] == status
+                assert dict(start["headers"])[b"x-served-by"] == b"test"
+
+    anyio.run(main)
@@ -0,0 +1,81 @@
+import anyio
+import pytest
+
+from starlette.route import Route
+from starlette.response import PlainTextResponse
+from starlette.application import Starlette
+
+
+async def upload(request):
+    body = await request.body()
+    return PlainTextResponse(str(len(body)))
+
+
+async def call(app, chunks, headers=()):
+    messages = []
+    pending = [
+        {"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+        for index, chunk in enumerate(chunks)
+    ]
+
+    async def receive():
+        return pending.pop(0)
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/", "root_path": "",
+        "headers": list(headers), "query_string": b"",
+    }
+    await app(scope, receive, send)
+    return messages[0]["status"], b"".join(message.get("body", b"") for message in messages[1:])
+
+
+@pytest.mark.parametrize(
+    "chunks, headers",
+    [
+        ([b"x" * 20], [(b"content-length", b"20")]),
+        ([b"x" * 6, b"x" * 6], []),
+    ],
+)
+def test_body_size_limit_without_application(chunks, headers):
+    route = Route("/", upload, methods=["POST"], max_body_size=10)
+    assert anyio.run(call, route, chunks, headers) == (413, b"Request Entity Too Large")
+
+
+def test_body_size_limit_within_limit():
+    route = Route("/", upload, methods=["POST"], max_body_size=10)
+    assert anyio.run(call, route, [b"x" * 4, b"x" * 4]) == (200, b"8")
+
+
+@pytest.mark.parametrize(
+    "chunks, headers",
+    [
+        ([b"x" * 20], [(b"content-length", b"20")]),
+        ([b"x" * 6, b"x" * 6], []),
+    ],
+)
+def test_body_size_limit_uses_application_handler(chunks, headers):
+    async def too_large(request, exc):
+        return PlainTextResponse("custom", status_code=exc.status_code)
+
+    app = Starlette(
+        routes=[Route("/", upload, methods=["POST"], max_body_size=10)],
+        exception_handlers={413: too_large},
+    )
+    assert anyio.run(call, app, chunks, headers) == (413, b"custom")
+
+
+def test_warmup_prerenders_wrapped_response_endpoint():
+    """ endpoint 是响应对象时，即使外面包了 limit_body_size 也会提前渲染 """
+    rendered = []
+
+    class Prerendered(PlainTextResponse):
+        async def prerender(self):
+            rendered.append(self)
+
+    endpoint = Prerendered("static")
+    route = Route("/", endpoint, max_body_size=10)
+    anyio.run(route.warmup)
+    assert rendered == [endpoint]
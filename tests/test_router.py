@@ -0,0 +1,147 @@
+import anyio
+import pytest
+
+from starlette.route import Route, Mount, Host, NoMatchFound
+from starlette.router import Router
+from starlette.response import JSONResponse, PlainTextResponse
+
+
+async def path_params(request):
+    return JSONResponse(request.path_params)
+
+
+def text(content):
+    async def endpoint(request):
+        return PlainTextResponse(content)
+    return endpoint
+
+
+async def get(app, path, method="GET", host=None):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    headers = [] if host is None else [(b"host", host.encode("latin-1"))]
+    scope = {"type": "http", "method": method, "path": path, "root_path": "", "headers": headers, "query_string": b""}
+    await app(scope, receive, send)
+    return messages[0]["status"], b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def test_cached_sub_router_in_parameterised_mount():
+    """ 子 Router 的解析缓存不能把上一个请求从 Mount 继承的参数带给下一个请求 """
+    sub_router = Router([Route("/posts", path_params)], cache_size=100)
+    router = Router([Mount("/users/{uid}", app=sub_router)], cache_size=100)
+
+    async def main():
+        assert await get(router, "/users/1/posts") == (200, b'{"uid":"1"}')
+        assert await get(router, "/users/2/posts") == (200, b'{"uid":"2"}')
+        # 第二次访问命中缓存
+        assert await get(router, "/users/1/posts") == (200, b'{"uid":"1"}')
+
+    anyio.run(main)
+
+
+def test_cached_route_params_are_not_shared():
+    router = Router([Route("/items/{id:int}", path_params)], cache_size=100)
+
+    async def main():
+        assert await get(router, "/items/1") == (200, b'{"id":1}')
+        assert await get(router, "/items/2") == (200, b'{"id":2}')
+        assert await get(router, "/items/1") == (200, b'{"id":1}')
+
+    anyio.run(main)
+
+
+def test_static_param_and_convertor_routes():
+    router = Router([
+        Route("/users/me", text("me")),
+        Route("/users/{id:int}", path_params),
+        Route("/users/{name}", path_params),
+        Route("/files/{path:path}", path_params),
+    ])
+
+    async def main():
+        assert await get(router, "/users/me") == (200, b"me")
+        assert await get(router, "/users/7") == (200, b'{"id":7}')
+        assert await get(router, "/users/bob") == (200, b'{"name":"bob"}')
+        assert await get(router, "/files/css/site.css") == (200, b'{"path":"css/site.css"}')
+        assert (await get(router, "/users/7/posts"))[0] == 404
+
+    anyio.run(main)
+
+
+def test_registration_order_wins_over_specificity():
+    """ 与逐个匹配时相同：先注册的路由优先，即使后面有更具体的静态路由 """
+    router = Router([Route("/{name}", path_params), Route("/about", text("about"))])
+
+    async def main():
+        assert await get(router, "/about") == (200, b'{"name":"about"}')
+
+    anyio.run(main)
+
+
+def test_full_match_beats_earlier_partial_match():
+    router = Router([
+        Route("/items", text("post"), methods=["POST"]),
+        Route("/items", text("get"), methods=["GET"]),
+        Route("/only-post", text("post"), methods=["POST"]),
+    ])
+
+    async def main():
+        assert await get(router, "/items") == (200, b"get")
+        assert await get(router, "/items", method="POST") == (200, b"post")
+        assert (await get(router, "/only-post"))[0] == 405
+
+    anyio.run(main)
+
+
+def test_mount_and_host_precedence():
+    router = Router([
+        Route("/static/special", text("route")),
+        Mount("/static", routes=[Route("/{path:path}", text("mount"))]),
+        Host("api.example.com", routes=[Route("/", text("api"))]),
+        Mount("/", routes=[Route("/", text("site"))]),
+    ])
+
+    async def main():
+        assert await get(router, "/static/special") == (200, b"route")
+        assert await get(router, "/static/other.css") == (200, b"mount")
+        assert await get(router, "/", host="api.example.com") == (200, b"api")
+        assert await get(router, "/", host="api.example.com:8000") == (200, b"api")
+        assert await get(router, "/", host="www.example.com") == (200, b"site")
+
+    anyio.run(main)
+
+
+def test_cache_and_indexes_are_rebuilt_after_routes_change():
+    router = Router([Route("/items/{name}", path_params)], cache_size=100)
+
+    async def main():
+        assert await get(router, "/items/new") == (200, b'{"name":"new"}')
+        assert (await get(router, "/extra"))[0] == 404
+        router.routes.insert(0, Route("/items/new", text("static"), name="new_item"))
+        router.routes.append(Route("/extra", text("extra")))
+        assert await get(router, "/items/new") == (200, b"static")
+        assert await get(router, "/extra") == (200, b"extra")
+
+    anyio.run(main)
+    assert router.url_path_for("new_item") == "/items/new"
+
+
+def test_url_path_for():
+    router = Router([
+        Route("/users/{id:int}", path_params, name="user"),
+        Route("/files/{path:path}", path_params, name="file"),
+        Mount("/api", name="api", routes=[Route("/items/{name}", path_params, name="item")]),
+    ])
+    assert router.url_path_for("user", id=7) == "/users/7"
+    assert router.url_path_for("file", path="css/site.css") == "/files/css/site.css"
+    assert router.url_path_for("api:item", name="x") == "/api/items/x"
+    with pytest.raises(NoMatchFound):
+        router.url_path_for("user", name="bob")
+    with pytest.raises(NoMatchFound):
+        router.url_path_for("missing")
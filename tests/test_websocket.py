@@ -0,0 +1,105 @@
+import anyio
+import pytest
+
+from starlette.route import WebSocketRoute
+from starlette.router import Router
+from starlette.websocket import WebSocket, WebSocketDisconnect
+
+
+async def connect(app, send=None, path="/ws"):
+    messages = []
+    incoming = [{"type": "websocket.connect"}]
+
+    async def receive():
+        if incoming:
+            return incoming.pop(0)
+        await anyio.sleep_forever()
+
+    async def record(message):
+        messages.append(message)
+
+    scope = {"type": "websocket", "path": path, "root_path": "", "headers": [], "query_string": b""}
+    await app(scope, receive, send or record)
+    return messages
+
+
+def test_queued_messages_are_flushed_in_one_batch():
+    sessions = []
+
+    async def endpoint(websocket):
+        sessions.append(websocket)
+        await websocket.accept()
+        for index in range(3):
+            await websocket.send_text(str(index))
+
+    app = Router([WebSocketRoute("/ws", endpoint)])
+    messages = anyio.run(connect, app)
+
+    assert [message.get("text") for message in messages[1:]] == ["0", "1", "2"]
+    assert sessions[0].batches_sent == 1
+    assert sessions[0].frames_sent == 3
+
+
+def test_endpoint_error_cancels_writer_and_keeps_exception_type():
+    cancelled = []
+
+    async def send(message):
+        if message["type"] == "websocket.send":
+            try:
+                await anyio.sleep_forever()
+            finally:
+                cancelled.append(message["text"])
+
+    async def endpoint(websocket):
+        await websocket.accept()
+        await websocket.send_text("stuck")
+        await websocket.send_text("queued")
+        await anyio.sleep(0.01)
+        raise RuntimeError("endpoint failed")
+
+    app = Router([WebSocketRoute("/ws", endpoint)])
+    with pytest.raises(RuntimeError, match="endpoint failed"):
+        anyio.run(connect, app, send)
+    assert cancelled == ["stuck"]
+
+
+def test_send_after_writer_failure_raises_disconnect():
+    errors = []
+
+    async def send(message):
+        if message["type"] == "websocket.send":
+            raise OSError("client gone")
+
+    async def endpoint(websocket):
+        await websocket.accept()
+        await websocket.send_text("first")
+        await anyio.sleep(0.01)
+        try:
+            await websocket.send_text("second")
+        except WebSocketDisconnect as exc:
+            errors.append(exc.code)
+
+    app = Router([WebSocketRoute("/ws", endpoint)])
+    anyio.run(connect, app, send)
+    assert errors == [1006]
+
+
+def test_send_without_writer_is_direct():
+    """ 不经过 websocket_session（没有启动 writer）时 send_* 直接发送 """
+    messages = []
+
+    async def receive():
+        return {"type": "websocket.connect"}
+
+    async def send(message):
+        messages.append(message)
+
+    async def main():
+        websocket = WebSocket({"type": "websocket", "path": "/", "headers": []}, receive, send)
+        await websocket.accept()
+        await websocket.send_text("hello")
+        assert not websocket.offer({"type": "websocket.send", "text": "skipped"})
+        await websocket.close()
+
+    anyio.run(main)
+    assert [message["type"] for message in messages] == ["websocket.accept", "websocket.send", "websocket.close"]